@@ -8,6 +8,7 @@ app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], use_pages
 app.layout = html.Div(
     [
         dcc.Location(id="url", refresh=True),
+        dcc.Store(id="session-id", storage_type="session"),
         html.Div(
             [
                 html.Div(
@@ -39,6 +40,23 @@ def redirect_to_default(pathname):
     return dash.no_update
 
 
+# Give every browser tab an id, so the server can refine the tab's previous
+# filter result instead of filtering from scratch.
+app.clientside_callback(
+    """
+    function(pathname, sessionId) {
+        if (sessionId) {
+            return window.dash_clientside.no_update;
+        }
+        return Date.now().toString(36) + Math.random().toString(36).slice(2);
+    }
+    """,
+    dash.dependencies.Output("session-id", "data"),
+    dash.dependencies.Input("url", "pathname"),
+    dash.dependencies.State("session-id", "data"),
+)
+
+
 parser = argparse.ArgumentParser(
     description="Run the Dash app",
     formatter_class=argparse.ArgumentDefaultsHelpFormatter,
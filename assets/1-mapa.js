@@ -0,0 +1,31 @@
+// Show the addresses selected on the map page without reloading the map: the
+// ids are posted to the map document, which keeps its zoom and position.
+
+(function () {
+    var addresses = null;
+
+    function post(frame) {
+        if (addresses !== null && frame && frame.contentWindow) {
+            frame.contentWindow.postMessage({mapaAddresses: addresses}, "*");
+        }
+    }
+
+    // A (re)loaded map asks for the current selection.
+    window.addEventListener("message", function (event) {
+        var frame = document.getElementById("mapa");
+        if (frame && event.source === frame.contentWindow) {
+            if (event.data === "mapa-ready") {
+                post(frame);
+            }
+        }
+    });
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        mapa: {
+            show_addresses: function (ids) {
+                addresses = ids || [];
+                post(document.getElementById("mapa"));
+            },
+        },
+    });
+})();
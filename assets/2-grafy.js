@@ -0,0 +1,67 @@
+// Bin the per-year figures of the Grafy page by the selected interval, so that
+// switching the interval needs no request to the server. The counts are
+// additive over years because every edition has a single publication year.
+
+(function () {
+    function binTrace(trace, interval) {
+        var sums = new Map();
+        trace.x.forEach(function (year, i) {
+            var bin = Math.floor(year / interval) * interval;
+            sums.set(bin, (sums.get(bin) || 0) + trace.y[i]);
+        });
+        var x = Array.from(sums.keys()).sort(function (a, b) {
+            return a - b;
+        });
+        var y = x.map(function (bin) {
+            return sums.get(bin);
+        });
+        var binned = Object.assign({}, trace, {x: x, y: y});
+        if (trace.text !== undefined) {
+            binned.text = y;
+        }
+        return binned;
+    }
+
+    function binFigure(figure, ranks, interval) {
+        var traces = figure.data.map(function (trace, i) {
+            return {trace: binTrace(trace, interval), rank: ranks[i]};
+        });
+        // Plotly express orders the traces by their first bar, then by category.
+        traces.sort(function (a, b) {
+            var first = (a.trace.x[0] || 0) - (b.trace.x[0] || 0);
+            return first !== 0 ? first : a.rank - b.rank;
+        });
+
+        var bins = new Set();
+        traces.forEach(function (item) {
+            item.trace.x.forEach(function (bin) {
+                bins.add(bin);
+            });
+        });
+        // compute_dtick in pages/2-grafy.py
+        var dtick = Math.floor(bins.size / Math.min(Math.max(1, bins.size), 10));
+
+        var layout = Object.assign({}, figure.layout, {
+            xaxis: Object.assign({}, figure.layout.xaxis, {dtick: dtick}),
+        });
+        return {
+            data: traces.map(function (item) {
+                return item.trace;
+            }),
+            layout: layout,
+        };
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        grafy: {
+            rebin_years: function (series, interval) {
+                if (!series) {
+                    throw window.dash_clientside.PreventUpdate;
+                }
+                return series.figures.map(function (figure, i) {
+                    return binFigure(figure, series.ranks[i], interval || 1);
+                });
+            },
+        },
+    });
+})();
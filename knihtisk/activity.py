@@ -0,0 +1,42 @@
+"""Per-printer activity index built from the edition table."""
+
+from typing import NamedTuple
+
+import pandas as pd
+
+
+class PrinterActivity(NamedTuple):
+    # Indexed by printer: first_year, last_year and the number of editions.
+    summary: pd.DataFrame
+    # Indexed by printer, one column per year with the number of editions.
+    histogram: pd.DataFrame
+
+
+def build_printer_activity(editions: pd.DataFrame) -> PrinterActivity:
+    """Build the activity index in a single grouped pass over the editions.
+
+    Every edition has exactly one ``publishDate``, so the distinct editions
+    of a printer are the sum of its per-year histogram and its first and
+    last years are the outermost non-empty histogram columns.
+    """
+    histogram = (
+        editions[["Printer", "publishDate", "id"]]
+        .drop_duplicates()
+        .groupby(["Printer", "publishDate"], observed=True)
+        .size()
+        .unstack("publishDate", fill_value=0)
+        .sort_index(axis=1)
+    )
+
+    active = histogram.to_numpy() > 0
+    years = histogram.columns.to_numpy()
+    summary = pd.DataFrame(
+        {
+            "first_year": years[active.argmax(axis=1)],
+            "last_year": years[active.shape[1] - 1 - active[:, ::-1].argmax(axis=1)],
+            "editions": histogram.sum(axis=1).to_numpy(),
+        },
+        index=histogram.index,
+    )
+
+    return PrinterActivity(summary=summary, histogram=histogram)
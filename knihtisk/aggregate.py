@@ -0,0 +1,157 @@
+"""Group-by aggregations on integer codes.
+
+Grouping columns are turned into dense integer codes (category codes, or the
+rank of an integer value) and packed into one group number per row, so that
+counts and sums are a single ``np.bincount`` and distinct counts a single
+``np.unique`` over packed (group, item) keys. Results are returned as frames
+shaped like ``groupby(..., observed=True)`` output: one row per group that
+occurs, in sorted key order. Contingency tables of two keys are the same
+bincount, reshaped into a matrix.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+
+class Key(NamedTuple):
+    # Dense code of every row, -1 where the value is missing.
+    codes: np.ndarray
+    # Categorical dtype, or the sorted distinct values, that the codes index.
+    labels: pd.CategoricalDtype | np.ndarray
+
+    def take(self, rows: np.ndarray) -> "Key":
+        return Key(self.codes[rows], self.labels)
+
+    def decode(self, codes: np.ndarray):
+        if isinstance(self.labels, pd.CategoricalDtype):
+            return pd.Categorical.from_codes(codes, dtype=self.labels)
+        return self.labels[codes]
+
+
+class Groups(NamedTuple):
+    # Group number of every row, -1 where a key is missing.
+    codes: np.ndarray
+    keys: list[Key]
+    # Number of distinct values of every key.
+    shape: tuple[int, ...]
+
+    @property
+    def size(self) -> int:
+        return int(np.prod(self.shape, dtype=np.int64))
+
+
+def key(values: pd.Series) -> Key:
+    """Codes of a categorical or integer column."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return Key(values.cat.codes.to_numpy().astype(np.int64), values.dtype)
+    uniques, inverse = np.unique(values.to_numpy(), return_inverse=True)
+    return Key(inverse.astype(np.int64), uniques)
+
+
+def _cardinality(key: Key) -> int:
+    if isinstance(key.labels, pd.CategoricalDtype):
+        return len(key.labels.categories)
+    return len(key.labels)
+
+
+def groups(*keys: Key) -> Groups:
+    """Group numbers of rows keyed by ``keys``, which must be aligned."""
+    shape = tuple(_cardinality(key) for key in keys)
+    codes = np.zeros(len(keys[0].codes), dtype=np.int64)
+    missing = np.zeros(len(codes), dtype=bool)
+    for key, size in zip(keys, shape):
+        codes = codes * size + key.codes
+        missing |= key.codes < 0
+    codes[missing] = -1
+    return Groups(codes, list(keys), shape)
+
+
+def count(groups: Groups, weights=None) -> np.ndarray:
+    """Number of rows, or sum of ``weights``, of every group number."""
+    valid = groups.codes >= 0
+    if weights is None:
+        return np.bincount(groups.codes[valid], minlength=groups.size)
+    weights = np.asarray(weights, dtype=np.float64)[valid]
+    sums = np.bincount(groups.codes[valid], weights=weights, minlength=groups.size)
+    # bincount of no rows is integer even with weights.
+    return sums.astype(np.float64, copy=False)
+
+
+def distinct_count(groups: Groups, items: Key) -> np.ndarray:
+    """Number of distinct ``items`` of every group number."""
+    n_items = _cardinality(items)
+    valid = (groups.codes >= 0) & (items.codes >= 0)
+    packed = np.unique(groups.codes[valid] * n_items + items.codes[valid])
+    return np.bincount(packed // n_items, minlength=groups.size)
+
+
+def frame(groups: Groups, names: list[str], values: dict[str, np.ndarray]):
+    """Frame of the groups that occur, their keys as ``names`` and ``values``."""
+    occurring = np.flatnonzero(count(groups))
+    codes = np.unravel_index(occurring, groups.shape)
+    table = {
+        name: key.decode(key_codes)
+        for name, key, key_codes in zip(names, groups.keys, codes)
+    }
+    for name, column in values.items():
+        table[name] = column[occurring]
+    return pd.DataFrame(table)
+
+
+class Contingency(NamedTuple):
+    # Labels of the rows and columns, named after their dimension.
+    rows: pd.Index
+    columns: pd.Index
+    # Dense (rows, columns) matrix, or the cells that occur as
+    # ``(values, (row positions, column positions))``, the coordinate layout
+    # that ``scipy.sparse.coo_array`` accepts.
+    counts: np.ndarray | tuple
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.rows), len(self.columns)
+
+    @property
+    def sparse(self) -> bool:
+        return isinstance(self.counts, tuple)
+
+    def dense(self) -> "Contingency":
+        if not self.sparse:
+            return self
+        values, (rows, columns) = self.counts
+        counts = np.zeros(self.shape, dtype=values.dtype)
+        counts[rows, columns] = values
+        return self._replace(counts=counts)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.dense().counts, index=self.rows, columns=self.columns)
+
+
+def crosstab(
+    rows: Key, columns: Key, weights=None, names=(None, None), sparse=False
+) -> Contingency:
+    """Number of pairs, or sum of ``weights``, of ``rows`` and ``columns`` values.
+
+    Like ``pd.crosstab``, only values that occur in some pair get a row or a
+    column, in code order. Sums of integer weights stay integers.
+    """
+    pairs = groups(rows, columns)
+    cells = np.flatnonzero(count(pairs))
+    sums = count(pairs, weights)
+    if weights is not None and np.issubdtype(np.asarray(weights).dtype, np.integer):
+        sums = np.rint(sums).astype(np.int64)
+
+    row_codes, column_codes = np.divmod(cells, pairs.shape[1])
+    row_used, row_positions = np.unique(row_codes, return_inverse=True)
+    column_used, column_positions = np.unique(column_codes, return_inverse=True)
+    labels = [
+        pd.Index(key.decode(used), name=name)
+        for key, used, name in zip(pairs.keys, [row_used, column_used], names)
+    ]
+    if sparse:
+        counts = (sums[cells], (row_positions, column_positions))
+    else:
+        counts = sums.reshape(pairs.shape)[np.ix_(row_used, column_used)]
+    return Contingency(*labels, counts)
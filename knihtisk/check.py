@@ -0,0 +1,268 @@
+"""Check the edition model against the original row-level filtering.
+
+The pages used to filter the exploded CSV rows and drop duplicate rows after
+every filter. The model removes the duplicates once, when it is built, which
+is only correct because dropping duplicates commutes with filtering rows.
+This script recomputes the chart data the old way for a set of filter
+states and compares it with :mod:`knihtisk.query`, both on the row-level
+selection and on the cube. Run it from the repository root after changing
+the data files or the model::
+
+    python -m knihtisk.check
+"""
+
+import math
+import random
+import sys
+
+import pandas as pd
+
+from knihtisk import index as facet_index
+from knihtisk import query, store
+from knihtisk.cube import CubeSlice
+
+DEDUPLICATION_COLUMNS = [
+    "id",
+    "Printer",
+    "author",
+    "language_cs",
+    "genre",
+    "topic",
+    "Dynastie",
+]
+
+INTERVAL = 5
+
+# Filter changes in every walk of the session check.
+SESSION_STEPS = 10
+
+
+def legacy_filter(rows: pd.DataFrame, key: tuple) -> pd.DataFrame:
+    """``filter_table`` as it was before the edition model."""
+    filtered = rows[(rows["publishDate"] >= key[0]) & (rows["publishDate"] <= key[1])]
+    for column, values in zip(query.FILTER_COLUMNS, key[2:]):
+        if values:
+            filtered = filtered[filtered[column].isin(values)]
+    return filtered.drop_duplicates(subset=DEDUPLICATION_COLUMNS)
+
+
+def _legacy_scores(table: pd.DataFrame, by: str, facet: str, per=("id",)):
+    score = 1 / table.groupby(list(per), observed=True)[facet].transform("count")
+    return (
+        table.assign(score=score)
+        .groupby([by, facet], observed=True)["score"]
+        .sum()
+        .reset_index()
+    )
+
+
+def legacy_results(table: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    table = table.assign(interval=(table["publishDate"] // INTERVAL) * INTERVAL)
+    results = {
+        f"count/{by}": table.groupby(by, observed=True)["id"].nunique().reset_index()
+        for by in ["interval", "publishDate", "Dynastie", "Printer"]
+        + ["language_cs", "genre", "topic"]
+    }
+    for facet in ["language_cs", "genre", "topic"]:
+        results[f"score/interval/{facet}"] = _legacy_scores(table, "interval", facet)
+    results["score/Dynastie/language_cs"] = _legacy_scores(
+        table, "Dynastie", "language_cs", per=["Dynastie", "id"]
+    )
+    for facet in ["genre", "topic"]:
+        results[f"score/Dynastie/{facet}"] = _legacy_scores(table, "Dynastie", facet)
+        results[f"contingency/{facet}"] = pd.crosstab(
+            table[facet], table["language_cs"]
+        )
+    return results
+
+
+def model_results(selection) -> dict[str, pd.DataFrame]:
+    binned = query.with_interval(selection, INTERVAL)
+    results = {
+        f"count/{by}": query.distinct_counts(
+            binned if by == "interval" else selection, by
+        )
+        for by in ["interval", "publishDate", "Dynastie", "Printer"]
+        + ["language_cs", "genre", "topic"]
+    }
+    for facet in ["language_cs", "genre", "topic"]:
+        results[f"score/interval/{facet}"] = query.fractional_counts(
+            binned, "interval", facet
+        )
+    results["score/Dynastie/language_cs"] = query.fractional_counts(
+        selection, "Dynastie", "language_cs", per=["Dynastie", "id"]
+    )
+    for facet in ["genre", "topic"]:
+        results[f"score/Dynastie/{facet}"] = query.fractional_counts(
+            selection, "Dynastie", facet
+        )
+        results[f"contingency/{facet}"] = query.contingency(
+            selection, facet, "language_cs"
+        ).to_frame()
+    return results
+
+
+def _cells(table: pd.DataFrame) -> dict:
+    # Value of every (row, column) label pair, for frames of either shape.
+    if table.columns.name is not None or table.index.name is not None:
+        table = table.stack().rename("value").reset_index()
+        table = table[table["value"] != 0]
+    *keys, value = table.columns
+    return {
+        tuple(str(label) for label in labels): number
+        for *labels, number in table[[*keys, value]].itertuples(index=False)
+    }
+
+
+def differences(expected: dict, actual: dict) -> list[str]:
+    problems = []
+    for name, table in expected.items():
+        want, got = _cells(table), _cells(actual[name])
+        if want.keys() != got.keys():
+            problems.append(f"{name}: different groups")
+        elif not all(math.isclose(want[k], got[k], abs_tol=1e-9) for k in want):
+            problems.append(f"{name}: different values")
+    return problems
+
+
+def _filter_values(rows: pd.DataFrame) -> dict[str, list]:
+    return {
+        column: sorted(rows[column].dropna().unique().tolist())
+        for column in query.FILTER_COLUMNS
+    }
+
+
+def filter_states(rows: pd.DataFrame, count: int, seed: int = 0) -> list[tuple]:
+    """The full range, plus ``count`` random combinations of filters."""
+    rng = random.Random(seed)
+    low, high = int(rows["publishDate"].min()), int(rows["publishDate"].max())
+    values = _filter_values(rows)
+
+    states = [query.filter_key((low, high))]
+    for _ in range(count):
+        start = rng.randint(low, high)
+        selections = [
+            rng.sample(values[column], rng.randint(1, min(3, len(values[column]))))
+            if rng.random() < 0.3
+            else None
+            for column in query.FILTER_COLUMNS
+        ]
+        states.append(
+            query.filter_key((start, rng.randint(start, high)), *selections)
+        )
+    return states
+
+
+def session_walks(
+    rows: pd.DataFrame, count: int, steps: int = SESSION_STEPS, seed: int = 0
+) -> list[list[tuple]]:
+    """``count`` walks of ``steps`` states from the full range, as a user makes them.
+
+    Every step adds a value to one filter, removes one, clears the filter,
+    or narrows or widens the year range.
+    """
+    rng = random.Random(seed)
+    low, high = int(rows["publishDate"].min()), int(rows["publishDate"].max())
+    values = _filter_values(rows)
+
+    walks = []
+    for _ in range(count):
+        years = (low, high)
+        selections = {column: set() for column in query.FILTER_COLUMNS}
+        walk = []
+        for _ in range(steps):
+            column = rng.choice(query.FILTER_COLUMNS)
+            step = rng.random()
+            if step < 0.4:
+                selections[column].add(rng.choice(values[column]))
+            elif step < 0.55 and selections[column]:
+                selections[column].discard(rng.choice(sorted(selections[column])))
+            elif step < 0.65:
+                selections[column] = set()
+            elif step < 0.85:
+                start = rng.randint(*years)
+                years = (start, rng.randint(start, years[1]))
+            else:
+                years = (rng.randint(low, years[0]), rng.randint(years[1], high))
+            walk.append(query.filter_key(years, *selections.values()))
+        walks.append(walk)
+    return walks
+
+
+def _same_selection(actual, expected) -> bool:
+    return (
+        actual.editions.index.equals(expected.editions.index)
+        and all(
+            actual.bridges[column].index.equals(bridge.index)
+            for column, bridge in expected.bridges.items()
+        )
+        and actual.rows.equals(expected.rows)
+    )
+
+
+def check_sessions(index, rows: pd.DataFrame, count: int) -> tuple[int, int]:
+    """Compare selections refined within sessions with fresh ones.
+
+    Returns the number of refined states and of differences.
+    """
+    refined = failures = 0
+    for number, walk in enumerate(session_walks(rows, count)):
+        session = f"check-{number}"
+        previous = None
+        for key in walk:
+            if previous is not None:
+                refined += (
+                    facet_index.refine(
+                        index,
+                        previous[0][:2],
+                        dict(zip(query.FILTER_COLUMNS, previous[0][2:])),
+                        previous[1].editions.index.to_numpy(),
+                        key[:2],
+                        dict(zip(query.FILTER_COLUMNS, key[2:])),
+                    )
+                    is not None
+                )
+            # Without shared results, the session's previous one is refined.
+            query._selections.clear()
+            selection = query.select(index, key[:2], *key[2:], session=session)
+            if not _same_selection(selection, query._select(index, key)):
+                failures += 1
+                print(f"{key}: session: different selection")
+            previous = key, selection
+    return refined, failures
+
+
+def main(count: int = 50) -> int:
+    rows = store._prepare_rows()
+    index = store.facet_index()
+    cube = store.cube()
+
+    failures = 0
+    from_cube = 0
+    for key in filter_states(rows, count):
+        expected = legacy_results(legacy_filter(rows, key))
+        sources = {
+            "rows": query.select(index, key[:2], *key[2:]),
+            "summary": query.summarize(index, cube, key[:2], *key[2:]),
+        }
+        from_cube += isinstance(sources["summary"], CubeSlice)
+        for source, selection in sources.items():
+            for problem in differences(expected, model_results(selection)):
+                failures += 1
+                print(f"{key}: {source}: {problem}")
+
+    print(
+        f"{count + 1} filter states checked ({from_cube} on the cube), "
+        f"{failures} differences"
+    )
+
+    refined, session_failures = check_sessions(index, rows, count)
+    print(
+        f"{count * SESSION_STEPS} session states checked ({refined} refined), "
+        f"{session_failures} differences"
+    )
+    return 1 if failures or session_failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(arg) for arg in sys.argv[1:])))
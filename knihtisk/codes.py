@@ -0,0 +1,27 @@
+"""Helpers for working on the integer codes of categorical facet columns."""
+
+import numpy as np
+import pandas as pd
+
+
+def lookup_table(categories: pd.Index, values) -> np.ndarray:
+    """Boolean table indexed by category code, ``True`` for selected values.
+
+    The table has one extra trailing slot so that the missing-value code
+    ``-1`` maps to ``False``.
+    """
+    table = np.zeros(len(categories) + 1, dtype=bool)
+    positions = categories.get_indexer(list(values))
+    table[positions[positions >= 0]] = True
+    return table
+
+
+def isin(column: pd.Series, values) -> np.ndarray:
+    """Equivalent of ``column.isin(values)`` evaluated on category codes."""
+    table = lookup_table(column.cat.categories, values)
+    return table[column.cat.codes.to_numpy()]
+
+
+def labels(column: pd.Series) -> list:
+    """Distinct values of a categorical column, without building a new array."""
+    return column.cat.categories.tolist()
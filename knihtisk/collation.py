@@ -0,0 +1,98 @@
+"""Czech alphabetical order without the system locale.
+
+The order follows the Czech standard (ČSN 97 6030) as implemented by the
+``cs_CZ`` locales: "ch" is a letter of its own between "h" and "i"; "č",
+"ř", "š" and "ž" follow "c", "r", "s" and "z"; all other accents only break
+ties between otherwise equal words, and lowercase goes before uppercase
+after that. Spaces and punctuation sort before digits, and digits before
+letters, so "Novák, Jan" comes before "Nováková".
+
+Keys are computed once per distinct string and kept for the lifetime of the
+process.
+"""
+
+import unicodedata
+from functools import lru_cache
+
+ALPHABET = "a b c č d e f g h ch i j k l m n o p q r ř s š t u v w x y z ž".split()
+
+# Letters with their own place in the alphabet, written with a caron.
+CARON_LETTERS = {"c": "č", "r": "ř", "s": "š", "z": "ž"}
+CARON = "\u030c"
+
+# Letters that do not decompose into a base letter and accents.
+FOLDED_LETTERS = {"ł": "l", "ø": "o", "đ": "d", "ß": "ss", "æ": "ae", "œ": "oe"}
+
+# Tie-breaking order of accents: plain, acute, caron, ring, diaeresis, others.
+ACCENTS = ["", "\u0301", CARON, "\u030a", "\u0308"]
+
+# Primary weights: punctuation by code point, then digits, letters and any
+# other script.
+_DIGIT_BASE = 0x110000
+_LETTER_BASE = _DIGIT_BASE + 10
+_OTHER_BASE = _LETTER_BASE + len(ALPHABET)
+
+_LETTERS = {letter: _LETTER_BASE + rank for rank, letter in enumerate(ALPHABET)}
+
+
+def _accent(marks: str) -> int:
+    if marks in ACCENTS:
+        return ACCENTS.index(marks)
+    return len(ACCENTS) + sum(map(ord, marks))
+
+
+def _elements(text: str):
+    # (base, accents, uppercase) of every character; "ch" is a single element.
+    characters = []
+    for character in unicodedata.normalize("NFD", text):
+        if unicodedata.combining(character) and characters:
+            characters[-1][1] += character
+        else:
+            characters.append([character, ""])
+
+    position = 0
+    while position < len(characters):
+        base, marks = characters[position]
+        lower = base.lower()
+        upper = base != lower
+        position += 1
+        if lower == "c" and not marks and position < len(characters):
+            following, following_marks = characters[position]
+            if following.lower() == "h" and not following_marks:
+                position += 1
+                yield "ch", "", upper
+                continue
+        if lower in CARON_LETTERS and marks == CARON:
+            yield CARON_LETTERS[lower], "", upper
+            continue
+        for letter in FOLDED_LETTERS.get(lower, lower):
+            yield letter, marks, upper
+
+
+def _primary(letter: str) -> int:
+    if letter in _LETTERS:
+        return _LETTERS[letter]
+    if letter.isdigit():
+        return _DIGIT_BASE + unicodedata.digit(letter, 0)
+    if letter.isalpha():
+        return _OTHER_BASE + ord(letter)
+    return ord(letter)
+
+
+@lru_cache(maxsize=None)
+def sort_key(text: str) -> tuple:
+    """Key ordering ``text`` alphabetically in Czech."""
+    elements = list(_elements(text))
+    return (
+        tuple(_primary(letter) for letter, _, _ in elements),
+        tuple(_accent(marks) for _, marks, _ in elements),
+        tuple(upper for _, _, upper in elements),
+        text,
+    )
+
+
+def sort_czech(items, key=None) -> list:
+    """``items`` sorted in Czech alphabetical order of ``key(item)`` (or the item)."""
+    if key is None:
+        return sorted(items, key=lambda item: sort_key(str(item)))
+    return sorted(items, key=lambda item: sort_key(str(key(item))))
@@ -0,0 +1,89 @@
+"""Correspondence analysis of contingency tables, memoized by table content.
+
+Fitting the analysis is the most expensive step of the Grafy page, and many
+interactions (a year interval, a filter on a value outside the table) leave
+the tables unchanged. Results are therefore cached under a digest of the
+table's labels and counts, so the SVD only runs again for a different table.
+
+The analysis is the one ``prince.CA`` computes: an SVD of the standardized
+residuals, with principal coordinates of the rows and columns, and the sign
+of every dimension chosen so that the largest left singular vector entry is
+positive (the convention of scikit-learn's ``randomized_svd``, which prince
+uses).
+"""
+
+import hashlib
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from knihtisk.aggregate import Contingency
+from knihtisk.lru import LRUCache
+
+N_COMPONENTS = 2
+
+CA_CACHE_SIZE = 32
+
+_results = LRUCache(CA_CACHE_SIZE)
+
+
+class Margin(NamedTuple):
+    # Relative frequencies of the categories, and their inverse square roots.
+    masses: np.ndarray
+    scale: np.ndarray
+
+
+def table_digest(table: Contingency) -> str:
+    """Digest of the labels and counts of a contingency table."""
+    digest = hashlib.sha256()
+    for labels in [table.rows, table.columns]:
+        digest.update("\x1f".join(map(str, [labels.name, *labels])).encode("UTF-8"))
+        digest.update(b"\x1e")
+    counts = table.dense().counts.astype(np.int64)
+    digest.update(np.ascontiguousarray(counts).tobytes())
+    return digest.hexdigest()
+
+
+def _margin(sums: np.ndarray) -> Margin:
+    masses = sums / sums.sum()
+    return Margin(masses, masses**-0.5)
+
+
+def _svd(residuals: np.ndarray, n_components: int):
+    U, s, Vt = np.linalg.svd(residuals, full_matrices=False)
+    k = min(n_components, min(residuals.shape) - 1)
+    U, Vt = U[:, :k], Vt[:k]
+    signs = np.sign(U[np.argmax(np.abs(U), axis=0), np.arange(k)])
+    U, Vt = U * signs, Vt * signs[:, None]
+    # Dimensions past the rank of the table are zero, as in prince.
+    pad = n_components - k
+    return np.pad(U, ((0, 0), (0, pad))), np.pad(Vt, ((0, pad), (0, 0)))
+
+
+def _fit(table: Contingency) -> tuple[pd.DataFrame, pd.DataFrame]:
+    counts = table.dense().counts.astype(np.float64)
+    row_sums, column_sums = counts.sum(axis=1), counts.sum(axis=0)
+    rows, columns = _margin(row_sums), _margin(column_sums)
+
+    frequencies = counts / counts.sum()
+    residuals = (frequencies - np.outer(rows.masses, columns.masses)) * np.outer(
+        rows.scale, columns.scale
+    )
+    U, Vt = _svd(residuals, N_COMPONENTS)
+
+    row_profiles = counts / row_sums[:, None]
+    column_profiles = counts.T / column_sums[:, None]
+    return (
+        pd.DataFrame(row_profiles @ (columns.scale[:, None] * Vt.T), index=table.rows),
+        pd.DataFrame(column_profiles @ (rows.scale[:, None] * U), index=table.columns),
+    )
+
+
+def coordinates(table: Contingency) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Row and column coordinates of ``table`` on the first two dimensions.
+
+    The frames are shared by every caller with the same table and must not
+    be mutated.
+    """
+    return _results.get_or_compute(table_digest(table), lambda: _fit(table))
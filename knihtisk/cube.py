@@ -0,0 +1,234 @@
+"""Pre-aggregated edition counts at year, printer and dynasty granularity.
+
+The cube stores, per year, printer and dynasty cell, the number of editions
+and original rows, the number of editions, original rows and fractional
+score of every language, genre and topic, and the row counts of the genre
+and topic cross-tabulations with languages. Any filter on years, printers
+and dynasties selects whole cells, so the Grafy charts can be answered by
+summing cells instead of touching editions.
+
+An edition with several printers lies in several cells. Summing its cells
+then counts it more than once, except by a column whose value differs
+between them (the printer), and gives it more than its weight of one in
+fractional scores. Row counts, and so cross-tabulations, are exact either
+way. Every aggregation checks whether the cells answer it and otherwise
+falls back to the row-level selection, as all of them do under an
+attribute filter (author, language, genre, topic), which changes the
+weights inside a cell.
+"""
+
+from typing import Callable, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from knihtisk import aggregate, codes
+from knihtisk.schema import BRIDGE_COLUMNS, EditionModel
+
+CELL_COLUMNS = ["publishDate", "Printer", "Dynastie"]
+CONTINGENCY_PAIRS = [("genre", "language_cs"), ("topic", "language_cs")]
+
+
+class Cube(NamedTuple):
+    # True when no edition has several printers, so every edition is in one cell.
+    additive: bool
+    # Cell columns that tell apart the cells of every edition with several
+    # printers; distinct counts by them are sums over cells.
+    distinct_columns: frozenset[str]
+    # Cell columns, ``count`` of editions and their original ``rows``.
+    editions: pd.DataFrame
+    # Bridge column -> cell columns, value, ``count``, original ``rows`` and
+    # fractional ``score``.
+    bridges: dict[str, pd.DataFrame]
+    # (rows, columns) -> cell columns, both values and the original ``rows``.
+    contingencies: dict[tuple[str, str], pd.DataFrame]
+
+
+class CubeSlice(NamedTuple):
+    additive: bool
+    distinct_columns: frozenset[str]
+    editions: pd.DataFrame
+    bridges: dict[str, pd.DataFrame]
+    contingencies: dict[tuple[str, str], pd.DataFrame]
+    # The row-level selection of the same filter, for aggregations the cells
+    # cannot answer; computed on demand.
+    row_level: Callable[[], NamedTuple]
+
+
+def build_cube(model: EditionModel) -> Cube:
+    editions = model.editions
+    cells = editions[CELL_COLUMNS]
+
+    sizes = {
+        column: np.bincount(bridge["edition"], minlength=len(editions))
+        for column, bridge in model.bridges.items()
+    }
+    rows = np.prod(np.vstack(list(sizes.values())), axis=0)
+
+    bridges = {}
+    for column in BRIDGE_COLUMNS:
+        bridge = model.bridges[column]
+        edition = bridge["edition"].to_numpy()
+        table = cells.iloc[edition].reset_index(drop=True)
+        table[column] = bridge[column].array
+        table["rows"] = rows[edition] // sizes[column][edition]
+        table["score"] = 1 / sizes[column][edition]
+        bridges[column] = (
+            table.groupby(CELL_COLUMNS + [column], observed=True, dropna=False)
+            .agg(
+                count=("score", "size"),
+                rows=("rows", "sum"),
+                score=("score", "sum"),
+            )
+            .reset_index()
+        )
+
+    contingencies = {}
+    for row_column, column in CONTINGENCY_PAIRS:
+        pairs = model.bridges[row_column].merge(model.bridges[column], on="edition")
+        edition = pairs["edition"].to_numpy()
+        table = cells.iloc[edition].reset_index(drop=True)
+        table[row_column] = pairs[row_column].array
+        table[column] = pairs[column].array
+        table["rows"] = rows[edition] // (
+            sizes[row_column][edition] * sizes[column][edition]
+        )
+        contingencies[row_column, column] = (
+            table.groupby(
+                CELL_COLUMNS + [row_column, column], observed=True, dropna=False
+            )["rows"]
+            .sum()
+            .reset_index()
+        )
+
+    return Cube(
+        additive=bool(editions["id"].is_unique),
+        distinct_columns=frozenset(
+            column
+            for column in CELL_COLUMNS
+            if not editions.duplicated(["id", column]).any()
+        ),
+        editions=(
+            cells.assign(rows=rows)
+            .groupby(CELL_COLUMNS, observed=True, dropna=False)
+            .agg(count=("rows", "size"), rows=("rows", "sum"))
+            .reset_index()
+        ),
+        bridges=bridges,
+        contingencies=contingencies,
+    )
+
+
+def answers(cube: Cube, key: tuple) -> bool:
+    """Whether a normalized filter key selects whole cells of the cube.
+
+    Only the year range and the printer and dynasty selections may be set.
+    """
+    return not any(key[4:])
+
+
+def sums_distinct(cube_slice: CubeSlice, by: str) -> bool:
+    """Whether the distinct editions per value of ``by`` are sums over cells."""
+    return cube_slice.additive or by in cube_slice.distinct_columns
+
+
+def sums_fractional(cube_slice: CubeSlice, per) -> bool:
+    """Whether every ``per`` group of editions lies in a single cell."""
+    return "id" in per and (
+        cube_slice.additive or not cube_slice.distinct_columns.isdisjoint(per)
+    )
+
+
+def _cell_mask(table: pd.DataFrame, key: tuple) -> np.ndarray:
+    year = table["publishDate"].to_numpy()
+    mask = (year >= key[0]) & (year <= key[1])
+    printers, dynasties = key[2:4]
+    if printers:
+        mask &= codes.isin(table["Printer"], printers)
+    if dynasties:
+        mask &= codes.isin(table["Dynastie"], dynasties)
+    return mask
+
+
+def slice_cube(cube: Cube, key: tuple, row_level) -> CubeSlice:
+    """Cells within the year range and printer and dynasty selections of ``key``.
+
+    ``row_level`` computes the row-level selection of ``key``.
+    """
+    return CubeSlice(
+        additive=cube.additive,
+        distinct_columns=cube.distinct_columns,
+        editions=cube.editions[_cell_mask(cube.editions, key)],
+        bridges={
+            column: table[_cell_mask(table, key)]
+            for column, table in cube.bridges.items()
+        },
+        contingencies={
+            pair: table[_cell_mask(table, key)]
+            for pair, table in cube.contingencies.items()
+        },
+        row_level=row_level,
+    )
+
+
+def with_interval(cube_slice: CubeSlice, interval: int) -> CubeSlice:
+    def binned(table):
+        return table.assign(interval=(table["publishDate"] // interval) * interval)
+
+    return cube_slice._replace(
+        editions=binned(cube_slice.editions),
+        bridges={column: binned(table) for column, table in cube_slice.bridges.items()},
+    )
+
+
+def distinct_counts(cube_slice: CubeSlice, by: str) -> pd.DataFrame:
+    table = cube_slice.bridges.get(by, cube_slice.editions)
+    groups = aggregate.groups(aggregate.key(table[by]))
+    counts = aggregate.count(groups, table["count"]).astype(np.int64)
+    return aggregate.frame(groups, [by], {"count": counts})
+
+
+def fractional_counts(cube_slice: CubeSlice, by: str, facet: str) -> pd.DataFrame:
+    table = cube_slice.bridges[facet]
+    groups = aggregate.groups(
+        aggregate.key(table[by]), aggregate.key(table[facet])
+    )
+    return aggregate.frame(
+        groups, [by, facet], {"score": aggregate.count(groups, table["score"])}
+    )
+
+
+def tabulates(cube_slice: CubeSlice, rows: str, columns: str) -> bool:
+    """Whether the cells hold the cross-tabulation of ``rows`` and ``columns``."""
+    return (
+        rows in CELL_COLUMNS
+        or columns in CELL_COLUMNS
+        or (rows, columns) in cube_slice.contingencies
+        or (columns, rows) in cube_slice.contingencies
+    )
+
+
+def _contingency_table(cube_slice: CubeSlice, rows: str, columns: str):
+    if rows in CELL_COLUMNS and columns in CELL_COLUMNS:
+        return cube_slice.editions
+    if rows in CELL_COLUMNS:
+        return cube_slice.bridges[columns]
+    if columns in CELL_COLUMNS:
+        return cube_slice.bridges[rows]
+    for pair in [(rows, columns), (columns, rows)]:
+        if pair in cube_slice.contingencies:
+            return cube_slice.contingencies[pair]
+    raise ValueError(f"The cube has no cross-tabulation of {rows} and {columns}")
+
+
+def contingency(
+    cube_slice: CubeSlice, rows: str, columns: str, sparse=False
+) -> aggregate.Contingency:
+    table = _contingency_table(cube_slice, rows, columns)
+    return aggregate.crosstab(
+        aggregate.key(table[rows]),
+        aggregate.key(table[columns]),
+        table["rows"].to_numpy(),
+        names=(rows, columns),
+        sparse=sparse,
+    )
@@ -0,0 +1,80 @@
+"""Faceted navigation: the values of every facet that still have matches.
+
+Every facet dropdown offers the values that have editions under the year
+range and the selections of all the *other* facets, together with their
+number of editions, like the facets of a search engine. Counting runs on the
+postings of :mod:`knihtisk.index`: one filter for the facets without a
+selection, one more per facet with a selection, and a distinct count of the
+editions' ids over their codes.
+"""
+
+import numpy as np
+import pandas as pd
+
+from knihtisk import aggregate
+from knihtisk import index as facet_index
+from knihtisk.collation import sort_key
+from knihtisk.index import FacetIndex
+from knihtisk.query import FILTER_COLUMNS
+
+
+def _key(values: pd.Series, rows: np.ndarray) -> aggregate.Key:
+    # Key of the categorical ``values`` at ``rows``, without converting the rest.
+    codes = values.cat.codes.to_numpy()[rows].astype(np.int64)
+    return aggregate.Key(codes, values.dtype)
+
+
+def _value_counts(index: FacetIndex, column: str, positions: np.ndarray):
+    # Distinct ids of the editions ``positions`` per category code of ``column``.
+    editions = index.model.editions
+    if column in index.model.bridges:
+        bridge = index.model.bridges[column]
+        rows = facet_index.bridge_rows(index, column, positions)
+        values = _key(bridge[column], rows)
+        ids = _key(editions["id"], bridge["edition"].to_numpy()[rows])
+    else:
+        values = _key(editions[column], positions)
+        ids = _key(editions["id"], positions)
+    return aggregate.distinct_count(aggregate.groups(values), ids)
+
+
+def facet_counts(index: FacetIndex, key: tuple, columns=FILTER_COLUMNS) -> dict:
+    """Editions of every value of ``columns`` under the filter ``key``.
+
+    The counts of a facet ignore the facet's own selection, and are indexed
+    by the facet's category codes (``index.facets[column].categories``).
+    """
+    filters = dict(zip(FILTER_COLUMNS, key[2:]))
+    unselected = None
+    counts = {}
+    for column in columns:
+        if filters[column]:
+            positions = facet_index.match(index, key[:2], {**filters, column: ()})
+        else:
+            if unselected is None:
+                unselected = facet_index.match(index, key[:2], filters)
+            positions = unselected
+        counts[column] = _value_counts(index, column, positions)
+    return counts
+
+
+def option(value, count=None, search=None) -> dict:
+    """Dropdown option of ``value``, labelled with its ``count`` if given."""
+    label = value if count is None else f"{value} ({count})"
+    if search is None:
+        return {"label": label, "value": value}
+    return {"label": label, "value": value, "search": search}
+
+
+def options(index: FacetIndex, column: str, counts, selected=None) -> list[dict]:
+    """Options of the values of ``column`` with editions, in Czech order.
+
+    Selected values stay in the list even without editions, so that the
+    dropdown keeps them.
+    """
+    categories = index.facets[column].categories
+    shown = set(np.flatnonzero(counts).tolist())
+    selected_codes = categories.get_indexer(list(selected or []))
+    shown.update(selected_codes[selected_codes >= 0].tolist())
+    codes = sorted(shown, key=lambda code: sort_key(str(categories[code])))
+    return [option(categories[code], int(counts[code])) for code in codes]
@@ -0,0 +1,275 @@
+"""Inverted index over the facet values of the edition model.
+
+Every facet value maps to the set of edition numbers carrying it. Sets are
+stored like roaring containers: a sorted ``int32`` array while the value is
+rare, and a packed bitmap (one bit per edition) once the array would be
+larger than the bitmap. Filtering ORs the sets of the selected values within
+a facet and ANDs the facets together, smallest first, so its cost follows the
+size of the matching sets rather than the size of the table. Editions are
+ordered by year, so a year range is a contiguous slice of edition numbers.
+
+A filter state that narrows an earlier one, or widens one of its filters,
+can also be answered from the earlier result by checking only the editions
+that may have changed (see :func:`refine`).
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from knihtisk.schema import BRIDGE_COLUMNS, EditionModel
+
+EDITION_FACETS = ["Printer", "Dynastie"]
+
+# A sorted array of n int32 positions outgrows a bitmap of ``size`` bits once
+# n * 32 > size.
+_BITS_PER_POSITION = 32
+
+
+class Bitmap(NamedTuple):
+    bits: np.ndarray  # uint8, little bit order
+    size: int
+
+
+class Postings(NamedTuple):
+    categories: pd.Index
+    # Editions of value ``code`` are ``editions[offsets[code]:offsets[code + 1]]``.
+    offsets: np.ndarray
+    editions: np.ndarray
+    # Packed bitmaps of the frequent values, keyed by category code.
+    bitmaps: dict[int, Bitmap]
+
+
+class FacetIndex(NamedTuple):
+    model: EditionModel
+    # publishDate of every edition, ascending.
+    years: np.ndarray
+    facets: dict[str, Postings]
+    # Bridge rows of edition ``e`` are ``offsets[e]:offsets[e + 1]``.
+    bridge_offsets: dict[str, np.ndarray]
+
+
+def _bitmap(positions: np.ndarray, size: int) -> Bitmap:
+    flags = np.zeros(size, dtype=bool)
+    flags[positions] = True
+    return Bitmap(np.packbits(flags, bitorder="little"), size)
+
+
+def _build_postings(values: pd.Series, editions: np.ndarray, size: int) -> Postings:
+    value_codes = values.cat.codes.to_numpy()
+    # A stable sort keeps the editions of each value in ascending order.
+    order = np.argsort(value_codes, kind="stable")
+    order = order[value_codes[order] >= 0]
+
+    categories = values.cat.categories
+    counts = np.bincount(value_codes[order], minlength=len(categories))
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    postings = editions[order].astype(np.int32)
+
+    bitmaps = {
+        int(code): _bitmap(postings[offsets[code] : offsets[code + 1]], size)
+        for code in np.flatnonzero(counts * _BITS_PER_POSITION > size)
+    }
+    return Postings(categories, offsets, postings, bitmaps)
+
+
+def build_index(model: EditionModel) -> FacetIndex:
+    editions = model.editions
+    size = len(editions)
+    numbers = np.arange(size, dtype=np.int32)
+
+    facets = {
+        column: _build_postings(editions[column], numbers, size)
+        for column in EDITION_FACETS
+    }
+    bridge_offsets = {}
+    for column in BRIDGE_COLUMNS:
+        bridge = model.bridges[column]
+        bridge_editions = bridge["edition"].to_numpy()
+        facets[column] = _build_postings(bridge[column], bridge_editions, size)
+        bridge_offsets[column] = np.searchsorted(
+            bridge_editions, np.arange(size + 1)
+        )
+
+    return FacetIndex(
+        model=model,
+        years=editions["publishDate"].to_numpy(),
+        facets=facets,
+        bridge_offsets=bridge_offsets,
+    )
+
+
+def _union(postings: Postings, values, size: int) -> tuple[np.ndarray | Bitmap, int]:
+    # Editions carrying any of ``values``, with the number of postings read.
+    selected = postings.categories.get_indexer(list(values))
+    selected = selected[selected >= 0]
+
+    bitmaps = [
+        postings.bitmaps[code] for code in selected if code in postings.bitmaps
+    ]
+    arrays = [
+        postings.editions[postings.offsets[code] : postings.offsets[code + 1]]
+        for code in selected
+        if code not in postings.bitmaps
+    ]
+    cardinality = int(np.sum(np.diff(postings.offsets)[selected]))
+
+    if not bitmaps:
+        if len(arrays) == 1:
+            return arrays[0], cardinality
+        merged = np.concatenate(arrays or [np.empty(0, dtype=np.int32)])
+        return np.unique(merged), cardinality
+
+    bits = np.bitwise_or.reduce([bitmap.bits for bitmap in bitmaps])
+    if arrays:
+        bits = bits | _bitmap(np.concatenate(arrays), size).bits
+    return Bitmap(bits, size), cardinality
+
+
+def _contains(bitmap: Bitmap, positions: np.ndarray) -> np.ndarray:
+    return ((bitmap.bits[positions >> 3] >> (positions & 7)) & 1).astype(bool)
+
+
+def _intersect(left, right):
+    if isinstance(left, Bitmap) and isinstance(right, Bitmap):
+        return Bitmap(left.bits & right.bits, left.size)
+    if isinstance(left, Bitmap):
+        left, right = right, left
+    if isinstance(right, Bitmap):
+        return left[_contains(right, left)]
+    return np.intersect1d(left, right, assume_unique=True)
+
+
+def _crop(matches, start: int, stop: int) -> np.ndarray:
+    # Sorted edition numbers of ``matches`` within [start, stop).
+    if isinstance(matches, Bitmap):
+        first = start >> 3
+        flags = np.unpackbits(
+            matches.bits[first : (stop + 7) >> 3], bitorder="little"
+        )
+        positions = np.flatnonzero(flags) + (first << 3)
+    else:
+        positions = matches
+    low, high = np.searchsorted(positions, [start, stop])
+    return positions[low:high]
+
+
+def year_slice(index: FacetIndex, year_range) -> tuple[int, int]:
+    """Edition numbers ``[start, stop)`` published within ``year_range``."""
+    start = np.searchsorted(index.years, year_range[0], side="left")
+    stop = np.searchsorted(index.years, year_range[1], side="right")
+    return int(start), int(stop)
+
+
+def match(index: FacetIndex, year_range, filters: dict) -> np.ndarray:
+    """Sorted edition numbers matching ``year_range`` and every active filter.
+
+    ``filters`` maps facet columns to the selected values; an empty or
+    missing selection does not restrict the facet.
+    """
+    start, stop = year_slice(index, year_range)
+    size = len(index.years)
+
+    sets = []
+    for column, values in filters.items():
+        if not values:
+            continue
+        matches, cardinality = _union(index.facets[column], values, size)
+        if not isinstance(matches, Bitmap):
+            matches = _crop(matches, start, stop)
+            cardinality = len(matches)
+        sets.append((matches, cardinality))
+
+    if not sets:
+        return np.arange(start, stop)
+
+    sets.sort(key=lambda item: item[1])
+    matches = sets[0][0]
+    for other, _ in sets[1:]:
+        matches = _intersect(matches, other)
+
+    return _crop(matches, start, stop)
+
+
+def bridge_rows(index: FacetIndex, column: str, positions: np.ndarray) -> np.ndarray:
+    """Rows of the ``column`` bridge of the editions ``positions``, in order."""
+    offsets = index.bridge_offsets[column]
+    starts = offsets[positions]
+    lengths = offsets[positions + 1] - starts
+    shift = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return shift + np.arange(lengths.sum())
+
+
+def check(index: FacetIndex, positions: np.ndarray, filters: dict) -> np.ndarray:
+    """The sorted editions ``positions`` that match every active filter."""
+    size = len(index.years)
+    for column, values in filters.items():
+        if values and len(positions):
+            matches, _ = _union(index.facets[column], values, size)
+            positions = _intersect(positions, matches)
+    return positions
+
+
+def _merge(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    # Union of two disjoint sorted arrays.
+    return np.insert(left, np.searchsorted(left, right), right)
+
+
+def _narrows(previous, values) -> bool:
+    return bool(values) and (not previous or set(values) <= set(previous))
+
+
+def refine(
+    index: FacetIndex,
+    previous_range,
+    previous_filters: dict,
+    previous: np.ndarray,
+    year_range,
+    filters: dict,
+) -> np.ndarray | None:
+    """:func:`match` derived from the result ``previous`` of an earlier state.
+
+    A narrower state (a shorter year range, fewer selected values or a newly
+    restricted facet) only checks the previous matches against the changed
+    filters. A state adding rare values to one filter only checks the
+    editions carrying the added values against the other filters. Returns
+    ``None`` when the states are related in any other way.
+    """
+    start, stop = year_slice(index, year_range)
+    previous_start, previous_stop = year_slice(index, previous_range)
+    changed = [
+        column
+        for column in filters.keys() | previous_filters.keys()
+        if set(filters.get(column) or ()) != set(previous_filters.get(column) or ())
+    ]
+
+    if (
+        previous_start <= start
+        and stop <= previous_stop
+        and all(_narrows(previous_filters.get(c), filters.get(c)) for c in changed)
+    ):
+        low, high = np.searchsorted(previous, [start, stop])
+        return check(index, previous[low:high], {c: filters.get(c) for c in changed})
+
+    if len(changed) == 1 and (start, stop) == (previous_start, previous_stop):
+        column = changed[0]
+        values = set(filters.get(column) or ())
+        previous_values = set(previous_filters.get(column) or ())
+        # Dropping a facet's selection altogether widens it to every edition,
+        # which is cheaper to match from scratch.
+        if previous_values and values > previous_values:
+            added, _ = _union(
+                index.facets[column], values - previous_values, len(index.years)
+            )
+            # Frequent values are stored as bitmaps; those are cheaper to
+            # match from scratch than to check edition by edition.
+            if not isinstance(added, Bitmap):
+                candidates = _crop(added, start, stop)
+                found = np.searchsorted(previous, candidates)
+                known = found < len(previous)
+                known[known] = previous[found[known]] == candidates[known]
+                others = {c: v for c, v in filters.items() if c != column}
+                return _merge(previous, check(index, candidates[~known], others))
+
+    return None
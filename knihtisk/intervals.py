@@ -0,0 +1,79 @@
+"""Static interval tree over closed year intervals.
+
+Every node holds the intervals containing its center, sorted by start and by
+end, and the intervals entirely before and after the center go to its left
+and right subtrees. The center is the median of the remaining endpoints, so
+the tree has logarithmic depth, and a query for the intervals overlapping a
+range visits one path per range end plus the nodes inside the range, taking
+each node's matches with a binary search.
+"""
+
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+
+class IntervalNode(NamedTuple):
+    center: float
+    # Ids of the intervals containing the center by ascending start, with
+    # their starts, and by descending end, with their ends negated.
+    by_start: np.ndarray
+    starts: np.ndarray
+    by_end: np.ndarray
+    negated_ends: np.ndarray
+    # Intervals ending before and starting after the center.
+    left: Optional["IntervalNode"]
+    right: Optional["IntervalNode"]
+
+
+def _build(starts: np.ndarray, ends: np.ndarray, ids: np.ndarray):
+    if len(ids) == 0:
+        return None
+    center = float(np.median(np.concatenate([starts, ends])))
+    before, after = ends < center, starts > center
+    here = ~(before | after)
+
+    by_start = np.argsort(starts[here], kind="stable")
+    by_end = np.argsort(-ends[here], kind="stable")
+    return IntervalNode(
+        center=center,
+        by_start=ids[here][by_start],
+        starts=starts[here][by_start],
+        by_end=ids[here][by_end],
+        negated_ends=-ends[here][by_end],
+        left=_build(starts[before], ends[before], ids[before]),
+        right=_build(starts[after], ends[after], ids[after]),
+    )
+
+
+def build_interval_tree(starts, ends, ids=None) -> IntervalNode | None:
+    """Tree of the intervals ``[starts[i], ends[i]]``, identified by ``ids``.
+
+    Ids default to the positions of the intervals; ``None`` is the empty tree.
+    """
+    starts, ends = np.asarray(starts), np.asarray(ends)
+    ids = np.arange(len(starts)) if ids is None else np.asarray(ids)
+    return _build(starts, ends, ids)
+
+
+def overlapping(tree: IntervalNode | None, low, high) -> np.ndarray:
+    """Ids of the intervals sharing at least one point with ``[low, high]``, sorted."""
+    found = []
+    nodes = [tree]
+    while nodes:
+        node = nodes.pop()
+        if node is None:
+            continue
+        if high < node.center:
+            found.append(node.by_start[: np.searchsorted(node.starts, high, "right")])
+            nodes.append(node.left)
+        elif low > node.center:
+            count = np.searchsorted(node.negated_ends, -low, "right")
+            found.append(node.by_end[:count])
+            nodes.append(node.right)
+        else:
+            found.append(node.by_start)
+            nodes += [node.left, node.right]
+    if not found:
+        return np.zeros(0, dtype=np.int64)
+    return np.sort(np.concatenate(found))
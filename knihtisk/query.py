@@ -0,0 +1,307 @@
+"""Filtering and aggregation on the edition model.
+
+Aggregations reproduce what the pages used to compute on the exploded
+(deduplicated) edition rows: distinct edition counts, and fractional scores
+in which every edition contributes a total weight of one, split over its
+original rows.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from knihtisk import aggregate, codes
+from knihtisk import cube as edition_cube
+from knihtisk import index as facet_index
+from knihtisk.cube import Cube, CubeSlice
+from knihtisk.lru import LRUCache
+from knihtisk.index import FacetIndex
+from knihtisk.schema import BRIDGE_COLUMNS
+
+
+# Filter results shared by all callbacks of one interaction, and by users
+# looking at the same view.
+SELECTION_CACHE_SIZE = 64
+
+# Sessions whose last filter result is kept, to refine their next one from.
+SESSION_CACHE_SIZE = 256
+
+# Facet columns in the order of the selections in a filter key.
+FILTER_COLUMNS = ["Printer", "Dynastie", "author", "language_cs", "genre", "topic"]
+
+
+class Selection(NamedTuple):
+    # Matching rows of the edition table, indexed by edition number.
+    editions: pd.DataFrame
+    # Matching bridge rows; values outside an active facet filter are dropped.
+    bridges: dict[str, pd.DataFrame]
+    # Number of original CSV rows of every selected edition: the product of
+    # its attribute counts.
+    rows: pd.Series
+
+
+def _local(editions: pd.DataFrame, bridge: pd.DataFrame) -> np.ndarray:
+    # Row in ``editions`` (indexed by ascending edition number) of each bridge row.
+    return np.searchsorted(editions.index.to_numpy(), bridge["edition"].to_numpy())
+
+
+def _row_counts(editions: pd.DataFrame, bridges: dict) -> pd.Series:
+    rows = np.ones(len(editions), dtype=np.int64)
+    for bridge in bridges.values():
+        rows *= np.bincount(_local(editions, bridge), minlength=len(editions))
+    return pd.Series(rows, index=editions.index)
+
+
+def filter_key(
+    year_range,
+    printers=None,
+    dynasties=None,
+    authors=None,
+    languages=None,
+    genres=None,
+    topics=None,
+) -> tuple:
+    """Normalized, hashable form of a filter state.
+
+    The key is the year range followed by one sorted tuple per facet of
+    ``FILTER_COLUMNS``; an empty selection is the same as no selection.
+    """
+    selections = (printers, dynasties, authors, languages, genres, topics)
+    return (int(year_range[0]), int(year_range[1])) + tuple(
+        tuple(sorted(set(values or ()))) for values in selections
+    )
+
+
+def _select(index: FacetIndex, key: tuple, previous=None) -> Selection:
+    model = index.model
+    filters = dict(zip(FILTER_COLUMNS, key[2:]))
+
+    positions = None
+    if previous is not None:
+        previous_key, previous_positions = previous
+        positions = facet_index.refine(
+            index,
+            previous_key[:2],
+            dict(zip(FILTER_COLUMNS, previous_key[2:])),
+            previous_positions,
+            key[:2],
+            filters,
+        )
+    if positions is None:
+        positions = facet_index.match(index, key[:2], filters)
+
+    bridges = {}
+    for column in BRIDGE_COLUMNS:
+        bridge = model.bridges[column]
+        rows = facet_index.bridge_rows(index, column, positions)
+        if filters[column]:
+            values = bridge[column]
+            table = codes.lookup_table(values.cat.categories, filters[column])
+            rows = rows[table[values.cat.codes.to_numpy()[rows]]]
+        bridges[column] = bridge.iloc[rows]
+
+    editions = model.editions.iloc[positions]
+    return Selection(
+        editions=editions, bridges=bridges, rows=_row_counts(editions, bridges)
+    )
+
+
+_selections = LRUCache(SELECTION_CACHE_SIZE)
+_sessions = LRUCache(SESSION_CACHE_SIZE)
+
+
+def _selection(index: FacetIndex, key: tuple, session) -> Selection:
+    if session is None:
+        return _selections.get_or_compute(
+            (id(index), key), lambda: _select(index, key)
+        )
+
+    # The last result of the session is refined instead of filtering from
+    # scratch; users mostly change one dropdown at a time.
+    slot = (id(index), session)
+    previous = _sessions.get(slot)
+    selection = _selections.get_or_compute(
+        (id(index), key), lambda: _select(index, key, previous)
+    )
+    # Only the matching positions are kept; they are all refining needs.
+    _sessions.put(slot, (key, selection.editions.index.to_numpy()))
+    return selection
+
+
+def select(
+    index: FacetIndex,
+    year_range,
+    printers=None,
+    dynasties=None,
+    authors=None,
+    languages=None,
+    genres=None,
+    topics=None,
+    session=None,
+) -> Selection:
+    """Editions matching all active filters; a filter matches any of its values.
+
+    Results are memoized by their normalized filter state and shared between
+    callers, so they must not be mutated. With a ``session`` id, the result is
+    derived from the session's previous one whenever the new state narrows
+    it or adds values to a single filter (see :func:`index.refine`).
+    """
+    key = filter_key(
+        year_range, printers, dynasties, authors, languages, genres, topics
+    )
+    return _selection(index, key, session)
+
+
+def summarize(
+    index: FacetIndex,
+    cube: Cube,
+    year_range,
+    printers=None,
+    dynasties=None,
+    authors=None,
+    languages=None,
+    genres=None,
+    topics=None,
+    session=None,
+) -> Selection | CubeSlice:
+    """Source for the aggregations below, from ``cube`` whenever it can answer.
+
+    Only filters on years, printers and dynasties are answered from the cube;
+    any other active filter falls back to the row-level :func:`select`. The
+    aggregations the cells cannot answer exactly (see :mod:`knihtisk.cube`)
+    fall back to it as well.
+    """
+    key = filter_key(
+        year_range, printers, dynasties, authors, languages, genres, topics
+    )
+    if edition_cube.answers(cube, key):
+        return _selections.get_or_compute(
+            (id(cube), key),
+            lambda: edition_cube.slice_cube(
+                cube, key, lambda: _selection(index, key, None)
+            ),
+        )
+    return _selection(index, key, session)
+
+
+def with_interval(
+    selection: Selection | CubeSlice, interval: int
+) -> Selection | CubeSlice:
+    """Add an ``interval`` column binning ``publishDate`` by ``interval`` years."""
+    if isinstance(selection, CubeSlice):
+        return edition_cube.with_interval(selection, interval)._replace(
+            row_level=lambda: with_interval(selection.row_level(), interval)
+        )
+    editions = selection.editions.assign(
+        interval=(selection.editions["publishDate"] // interval) * interval
+    )
+    return selection._replace(editions=editions)
+
+
+def pairs(selection: Selection, column: str) -> pd.DataFrame:
+    """Bridge rows of ``column`` joined with their edition's columns."""
+    return selection.bridges[column].join(selection.editions, on="edition", how="inner")
+
+
+def distinct_counts(selection: Selection | CubeSlice, by: str) -> pd.DataFrame:
+    """Number of distinct editions (ids) per value of ``by``."""
+    if isinstance(selection, CubeSlice):
+        if edition_cube.sums_distinct(selection, by):
+            return edition_cube.distinct_counts(selection, by)
+        selection = selection.row_level()
+    editions = selection.editions
+    ids = aggregate.key(editions["id"])
+    if by in selection.bridges:
+        bridge = selection.bridges[by]
+        groups = aggregate.groups(aggregate.key(bridge[by]))
+        ids = ids.take(_local(editions, bridge))
+    else:
+        groups = aggregate.groups(aggregate.key(editions[by]))
+    counts = aggregate.distinct_count(groups, ids)
+    return aggregate.frame(groups, [by], {"id": counts})
+
+
+def fractional_counts(
+    selection: Selection | CubeSlice, by: str, facet: str, per=("id",)
+) -> pd.DataFrame:
+    """Scores per ``by`` and ``facet`` value, each ``per`` group weighing one."""
+    if isinstance(selection, CubeSlice):
+        # Every ``per`` group is a single edition row of one cell, so the
+        # cell scores are the group scores.
+        if edition_cube.sums_fractional(selection, per):
+            return edition_cube.fractional_counts(selection, by, facet)
+        selection = selection.row_level()
+    editions = selection.editions
+    rows = selection.rows.to_numpy()
+    per_groups = aggregate.groups(*(aggregate.key(editions[c]) for c in per))
+    totals = aggregate.count(per_groups, rows)
+    in_group = per_groups.codes >= 0
+    share = np.zeros(len(rows))
+    share[in_group] = rows[in_group] / totals[per_groups.codes[in_group]]
+
+    bridge = selection.bridges[facet]
+    local = _local(editions, bridge)
+    per_value = np.bincount(local, minlength=len(editions))
+    score = share[local] / per_value[local]
+
+    groups = aggregate.groups(
+        aggregate.key(editions[by]).take(local), aggregate.key(bridge[facet])
+    )
+    # Editions outside every ``per`` group do not take part.
+    groups.codes[~in_group[local]] = -1
+    return aggregate.frame(
+        groups, [by, facet], {"score": aggregate.count(groups, score)}
+    )
+
+
+def _dimension(selection: Selection, column: str):
+    # Local edition and key of every value of ``column`` in the selection.
+    editions = selection.editions
+    if column in selection.bridges:
+        bridge = selection.bridges[column]
+        return _local(editions, bridge), aggregate.key(bridge[column])
+    return np.arange(len(editions)), aggregate.key(editions[column])
+
+
+def contingency(
+    selection: Selection | CubeSlice, rows: str, columns: str, sparse=False
+) -> aggregate.Contingency:
+    """Cross-tabulation of two columns counted over the original rows.
+
+    Either column may be an edition column (``Printer``, ``Dynastie``...) or
+    a bridge column. See :class:`aggregate.Contingency` for the ``sparse``
+    layout.
+    """
+    if isinstance(selection, CubeSlice):
+        if edition_cube.tabulates(selection, rows, columns):
+            return edition_cube.contingency(selection, rows, columns, sparse)
+        selection = selection.row_level()
+    n_editions = len(selection.editions)
+    row_local, row_key = _dimension(selection, rows)
+    column_local, column_key = _dimension(selection, columns)
+
+    # Every row value of an edition is paired with each of its column values.
+    row_sizes = np.bincount(row_local, minlength=n_editions)
+    column_sizes = np.bincount(column_local, minlength=n_editions)
+    column_order = np.argsort(column_local, kind="stable")
+    column_starts = np.cumsum(column_sizes) - column_sizes
+    repeats = column_sizes[row_local]
+    row_values = np.repeat(np.arange(len(row_local)), repeats)
+    offsets = np.arange(len(row_values)) - np.repeat(
+        np.cumsum(repeats) - repeats, repeats
+    )
+    column_values = column_order[column_starts[row_local[row_values]] + offsets]
+
+    # An edition's original rows are spread evenly over its pairs.
+    edition = row_local[row_values]
+    weights = selection.rows.to_numpy()[edition] // (
+        row_sizes[edition] * column_sizes[edition]
+    )
+    return aggregate.crosstab(
+        row_key.take(row_values),
+        column_key.take(column_values),
+        weights,
+        names=(rows, columns),
+        sparse=sparse,
+    )
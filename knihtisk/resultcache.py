@@ -0,0 +1,212 @@
+"""Optional SQLite cache of callback results, shared by all worker processes.
+
+The in-process caches are lost with every worker, so a deployment running
+several workers would render the same popular views once per worker. When
+the ``KNIHTISK_RESULT_CACHE`` environment variable names a database file,
+the rendered figures are stored there as compressed JSON under a key
+derived from the callback, its arguments and the content of the data files.
+Entries expire after ``KNIHTISK_RESULT_CACHE_TTL`` seconds, and the
+least recently used ones are evicted once the database holds more than
+``KNIHTISK_RESULT_CACHE_MB`` megabytes of results. Without the variable,
+callbacks simply compute their results.
+
+Statistics of the running cache::
+
+    KNIHTISK_RESULT_CACHE=data/.cache/results.sqlite python -m knihtisk.resultcache
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from plotly.io.json import to_json_plotly
+
+from knihtisk import store
+
+PATH_VARIABLE = "KNIHTISK_RESULT_CACHE"
+TTL_VARIABLE = "KNIHTISK_RESULT_CACHE_TTL"
+SIZE_VARIABLE = "KNIHTISK_RESULT_CACHE_MB"
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_SIZE_MB = 256
+
+# Part of every key; bump it when the figures change so that results
+# rendered by the previous code are not served again.
+RESULT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+CREATE TABLE IF NOT EXISTS stats (
+    namespace TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Drop the least recently used entries beyond the size budget.
+_EVICT = """
+DELETE FROM results WHERE key IN (
+    SELECT key FROM (
+        SELECT key, SUM(size) OVER (ORDER BY accessed DESC, key) AS kept
+        FROM results
+    )
+    WHERE kept > ?
+)
+"""
+
+
+class ResultCache:
+    """Results in one SQLite database, safe to share between processes."""
+
+    def __init__(self, path: str, ttl: float, max_bytes: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # SQLite connections must not cross threads or forked processes.
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _count(self, connection, namespace: str, column: str) -> None:
+        connection.execute(
+            f"INSERT INTO stats (namespace, {column}) VALUES (?, 1) "
+            f"ON CONFLICT (namespace) DO UPDATE SET {column} = {column} + 1",
+            (namespace,),
+        )
+
+    def get(self, namespace: str, key: str) -> str | None:
+        connection = self._connection()
+        now = time.time()
+        row = connection.execute(
+            "SELECT value FROM results WHERE key = ? AND created > ?",
+            (key, now - self.ttl),
+        ).fetchone()
+        if row is None:
+            self._count(connection, namespace, "misses")
+            return None
+        connection.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+        self._count(connection, namespace, "hits")
+        return zlib.decompress(row[0]).decode("UTF-8")
+
+    def put(self, namespace: str, key: str, payload: str) -> None:
+        value = zlib.compress(payload.encode("UTF-8"))
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                (key, namespace, value, len(value), now, now),
+            )
+            connection.execute(
+                "DELETE FROM results WHERE created <= ?", (now - self.ttl,)
+            )
+            connection.execute(_EVICT, (self.max_bytes,))
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Hits, misses, entries and stored bytes per namespace."""
+        connection = self._connection()
+        stats = {
+            namespace: {"hits": hits, "misses": misses, "entries": 0, "bytes": 0}
+            for namespace, hits, misses in connection.execute(
+                "SELECT namespace, hits, misses FROM stats"
+            )
+        }
+        for namespace, entries, size in connection.execute(
+            "SELECT namespace, COUNT(*), SUM(size) FROM results GROUP BY namespace"
+        ):
+            stats.setdefault(namespace, {"hits": 0, "misses": 0})
+            stats[namespace].update(entries=entries, bytes=size)
+        return stats
+
+
+_configured = None
+_configured_lock = threading.Lock()
+
+
+def configured() -> ResultCache | None:
+    """The cache selected by the environment, or ``None`` when it is off."""
+    global _configured
+    path = os.environ.get(PATH_VARIABLE)
+    if not path:
+        return None
+    with _configured_lock:
+        if _configured is None or _configured.path != path:
+            _configured = ResultCache(
+                path,
+                ttl=float(os.environ.get(TTL_VARIABLE, DEFAULT_TTL)),
+                max_bytes=int(
+                    float(os.environ.get(SIZE_VARIABLE, DEFAULT_SIZE_MB)) * 2**20
+                ),
+            )
+        return _configured
+
+
+def result_key(namespace: str, arguments, sources=()) -> str:
+    """Content-addressed key of a result of ``namespace`` for ``arguments``.
+
+    The key covers the content of the edition data and of the extra
+    ``sources`` files, so changed data never hits results of the old data.
+    """
+    parts = [RESULT_VERSION, namespace, store.fingerprint(*sources), arguments]
+    encoded = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("UTF-8")).hexdigest()
+
+
+def memoize(namespace: str, arguments, compute, sources=()):
+    """``compute()``, or its earlier result for the same ``arguments``.
+
+    The result must be JSON-serializable the way Dash serializes callback
+    outputs (figures, plain data); a cached result comes back as the
+    equivalent plain JSON data. Database errors only disable the cache for
+    the call.
+    """
+    cache = configured()
+    if cache is None:
+        return compute()
+
+    key = result_key(namespace, arguments, sources)
+    try:
+        payload = cache.get(namespace, key)
+    except (OSError, sqlite3.Error):
+        return compute()
+    if payload is not None:
+        return json.loads(payload)
+
+    result = compute()
+    try:
+        cache.put(namespace, key, to_json_plotly(result))
+    except (OSError, sqlite3.Error):
+        pass
+    return result
+
+
+if __name__ == "__main__":
+    cache = configured()
+    if cache is None:
+        raise SystemExit(f"{PATH_VARIABLE} is not set")
+    for namespace, counts in sorted(cache.stats().items()):
+        print(namespace, counts)
@@ -0,0 +1,82 @@
+"""Edition fact table with bridge tables for the multi-valued attributes.
+
+``Data_knihtisk.csv`` holds one row per combination of an edition's authors,
+languages, genres and topics. The model keeps one row per edition (and
+printer) in ``editions`` and one row per distinct attribute value in each
+bridge table, so its size grows with the number of editions instead of the
+product of their attributes. Because the CSV rows are exactly that product,
+the original rows can be recounted from the model whenever an aggregation
+needs row-level weights.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+EDITION_COLUMNS = ["id", "publishDate", "Printer", "Dynastie"]
+EDITION_KEY = ["id", "Printer", "Dynastie"]
+BRIDGE_COLUMNS = ["author", "language_cs", "genre", "topic"]
+
+
+class EditionModel(NamedTuple):
+    # One row per edition and printer, ordered by publishDate. The row
+    # position is the edition number referenced by the bridges.
+    editions: pd.DataFrame
+    # Column name -> frame of distinct (edition, value) pairs sorted by edition.
+    bridges: dict[str, pd.DataFrame]
+
+
+def _edition_key(frame: pd.DataFrame) -> np.ndarray:
+    key = np.zeros(len(frame), dtype=np.int64)
+    for column in EDITION_KEY:
+        categorical = frame[column]
+        key = key * (len(categorical.cat.categories) + 1)
+        key += categorical.cat.codes.to_numpy() + 1
+    return key
+
+
+def build_model(rows: pd.DataFrame) -> EditionModel:
+    """Split the exploded edition rows into the fact and bridge tables."""
+    editions = (
+        rows[EDITION_COLUMNS]
+        .drop_duplicates(subset=EDITION_KEY)
+        .sort_values("publishDate", kind="stable")
+        .reset_index(drop=True)
+    )
+
+    edition = pd.Index(_edition_key(editions)).get_indexer(_edition_key(rows))
+    edition = edition.astype(np.int32)
+
+    bridges = {}
+    for column in BRIDGE_COLUMNS:
+        bridge = pd.DataFrame({"edition": edition, column: rows[column].array})
+        bridges[column] = (
+            bridge.drop_duplicates()
+            .sort_values("edition", kind="stable")
+            .reset_index(drop=True)
+        )
+
+    return EditionModel(editions=editions, bridges=bridges)
+
+
+def _freeze_array(array) -> None:
+    # Clear the writeable flag on the array and every array it is a view of.
+    while isinstance(array, np.ndarray):
+        array.flags.writeable = False
+        array = array.base
+
+
+def freeze(model: EditionModel) -> EditionModel:
+    """Make the column arrays of ``model`` read-only, in place.
+
+    The model is shared by every page and callback; writing into it now
+    raises instead of silently changing the data seen by other requests.
+    """
+    for frame in [model.editions, *model.bridges.values()]:
+        for column in frame.columns:
+            values = frame[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.cat.codes
+            _freeze_array(values.to_numpy())
+    return model
@@ -0,0 +1,163 @@
+"""Typeahead search over the values of a facet column.
+
+Values are folded to lowercase without accents and split into words. Every
+word is indexed under its one- and two-letter prefixes and under all its
+trigrams. A typed word of one or two letters looks up the words starting
+with it; a longer word intersects the values of its trigrams and checks the
+candidates for the whole word, which may appear anywhere in the value. The
+values are numbered by their number of editions, most first, so the
+postings of every gram are already in rank order and the best matches are
+the first ones. Live counts under the current filters, when given, hide
+the values without editions and rank the others.
+"""
+
+import re
+import unicodedata
+from typing import NamedTuple
+
+import numpy as np
+
+from knihtisk.collation import FOLDED_LETTERS, sort_key
+from knihtisk.facets import option
+
+SEARCH_LIMIT = 50
+
+_WORD = re.compile(r"\w+")
+_NONE = np.zeros(0, dtype=np.int32)
+
+
+class SearchIndex(NamedTuple):
+    # Values in rank order, with their folded text, number of editions and
+    # position in the labels the index was built from.
+    labels: list
+    folded: list[str]
+    editions: np.ndarray
+    codes: np.ndarray
+    # Value -> its number.
+    numbers: dict
+    # Gram -> ascending value numbers; prefix grams start with "^".
+    grams: dict[str, np.ndarray]
+
+
+def fold(text: str) -> str:
+    """``text`` in lowercase, without accents."""
+    decomposed = unicodedata.normalize("NFD", str(text).casefold())
+    return "".join(
+        FOLDED_LETTERS.get(character, character)
+        for character in decomposed
+        if not unicodedata.combining(character)
+    )
+
+
+def _trigrams(word: str) -> set[str]:
+    return {word[start : start + 3] for start in range(len(word) - 2)}
+
+
+def _grams(word: str) -> set[str]:
+    return {"^" + word[:1], "^" + word[:2]} | _trigrams(word)
+
+
+def build_search_index(labels, editions) -> SearchIndex:
+    """Index ``labels`` with the number of ``editions`` of each of them."""
+    labels = list(labels)
+    editions = np.asarray(editions)
+    order = sorted(
+        range(len(labels)), key=lambda i: (-editions[i], sort_key(str(labels[i])))
+    )
+    labels = [labels[i] for i in order]
+    folded = [fold(label) for label in labels]
+
+    postings = {}
+    for number, text in enumerate(folded):
+        for gram in set().union(*map(_grams, _WORD.findall(text))):
+            postings.setdefault(gram, []).append(number)
+    grams = {
+        gram: np.array(numbers, dtype=np.int32) for gram, numbers in postings.items()
+    }
+    return SearchIndex(
+        labels=labels,
+        folded=folded,
+        editions=editions[order],
+        codes=np.array(order, dtype=np.int64),
+        numbers={label: number for number, label in enumerate(labels)},
+        grams=grams,
+    )
+
+
+def _candidates(index: SearchIndex, word: str) -> np.ndarray:
+    if len(word) <= 2:
+        return index.grams.get("^" + word, _NONE)
+    postings = sorted(
+        (index.grams.get(gram, _NONE) for gram in _trigrams(word)), key=len
+    )
+    candidates = postings[0]
+    for numbers in postings[1:]:
+        candidates = np.intersect1d(candidates, numbers, assume_unique=True)
+    return candidates
+
+
+def _matches(index: SearchIndex, words: list[str]) -> np.ndarray:
+    if not words:
+        return np.arange(len(index.labels))
+    matches = _candidates(index, words[0])
+    for word in words[1:]:
+        matches = np.intersect1d(matches, _candidates(index, word), assume_unique=True)
+    return matches
+
+
+def _search(index: SearchIndex, text, limit: int, counts) -> list[int]:
+    words = _WORD.findall(fold(text or ""))
+    matches = _matches(index, words)
+    if counts is not None:
+        live = counts[index.codes[matches]]
+        order = np.argsort(-live, kind="stable")
+        matches = matches[order[live[order] > 0]]
+
+    # Trigrams may occur in a value without forming the word.
+    long_words = [word for word in words if len(word) > 2]
+    found = []
+    for number in matches:
+        if all(word in index.folded[number] for word in long_words):
+            found.append(int(number))
+            if len(found) == limit:
+                break
+    return found
+
+
+def search(
+    index: SearchIndex, text: str | None, limit: int = SEARCH_LIMIT, counts=None
+) -> list:
+    """Up to ``limit`` values matching every word of ``text``, most editions first.
+
+    Without any word to search for, the values with the most editions.
+    ``counts`` are live numbers of editions, indexed like the labels the
+    index was built from; values without any are left out.
+    """
+    return [index.labels[number] for number in _search(index, text, limit, counts)]
+
+
+def options(
+    index: SearchIndex, text: str | None, selected=None, counts=None
+) -> list[dict]:
+    """Dropdown options of the values matching ``text``, and of ``selected``.
+
+    A multi-value dropdown drops selected values missing from its options.
+    Every option carries its folded text for the dropdown's own filtering,
+    so that it also matches what was typed without accents. With live
+    ``counts`` (see :func:`search`), the labels show them.
+    """
+    numbers = _search(index, text, SEARCH_LIMIT, counts)
+    shown = set(numbers)
+    numbers += [
+        index.numbers[value]
+        for value in selected or []
+        if value in index.numbers and index.numbers[value] not in shown
+    ]
+    return [
+        option(
+            index.labels[number],
+            None if counts is None else int(counts[index.codes[number]]),
+            index.folded[number],
+        )
+        for number in numbers
+    ]
@@ -0,0 +1,255 @@
+"""Shared, load-once access to the edition data used by all pages."""
+
+import hashlib
+import json
+import os
+import tempfile
+from functools import lru_cache
+
+import pandas as pd
+
+from knihtisk import aggregate, codes
+from knihtisk.activity import PrinterActivity, build_printer_activity
+from knihtisk.cube import Cube, build_cube
+from knihtisk.index import FacetIndex, build_index
+from knihtisk.schema import BRIDGE_COLUMNS, EditionModel, build_model, freeze
+from knihtisk.search import SearchIndex, build_search_index
+
+EDITIONS_PATH = "data/Data_knihtisk.csv"
+DYNASTIES_PATH = "data/dynastie_přehled.csv"
+
+STRING_COLUMNS = ["Printer", "genre", "topic", "author", "id", "language_cs"]
+
+# Facet columns are dictionary-encoded so that filters and group-bys work on
+# small integer codes instead of Python strings.
+CATEGORICAL_COLUMNS = STRING_COLUMNS + ["Dynastie"]
+
+# Prepared tables are cached as Parquet next to the sources. Bump the version
+# whenever the preparation below changes so that stale caches are rebuilt.
+CACHE_DIR = "data/.cache"
+CACHE_VERSION = 3
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifest_path(name: str) -> str:
+    return os.path.join(CACHE_DIR, f"{name}.json")
+
+
+def _parquet_path(name: str, table: str) -> str:
+    return os.path.join(CACHE_DIR, f"{name}-{table}.parquet")
+
+
+def _cache_is_fresh(name: str, sources: list[str]) -> bool:
+    try:
+        with open(_manifest_path(name), encoding="UTF-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    if manifest.get("version") != CACHE_VERSION:
+        return False
+    if sorted(manifest.get("sources", {})) != sorted(sources):
+        return False
+
+    touched = False
+    try:
+        for path in sources:
+            recorded = manifest["sources"][path]
+            stat = os.stat(path)
+            if (stat.st_size, stat.st_mtime_ns) == (
+                recorded["size"],
+                recorded["mtime_ns"],
+            ):
+                continue
+            # The file was touched; only its content decides whether it changed.
+            if stat.st_size != recorded["size"] or _sha256(path) != recorded["sha256"]:
+                return False
+            recorded["mtime_ns"] = stat.st_mtime_ns
+            touched = True
+    except (KeyError, TypeError):
+        # A manifest of another layout, or a damaged one.
+        return False
+
+    if touched:
+        try:
+            _write_manifest(name, manifest)
+        except OSError:
+            pass
+    return True
+
+
+def _publish(path: str, write) -> None:
+    # Every writer has its own temporary file, so workers filling a cold
+    # cache at the same time never write into a file another one publishes.
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix=os.path.basename(path), suffix=".tmp"
+    )
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _write_manifest(name: str, manifest: dict) -> None:
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="UTF-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    _publish(_manifest_path(name), write)
+
+
+def _read_cache(name: str, sources: list[str]) -> dict[str, pd.DataFrame] | None:
+    if not _cache_is_fresh(name, sources):
+        return None
+    try:
+        with open(_manifest_path(name), encoding="UTF-8") as f:
+            tables = json.load(f)["tables"]
+        return {table: pd.read_parquet(_parquet_path(name, table)) for table in tables}
+    except (ImportError, KeyError, OSError, ValueError):
+        return None
+
+
+def _write_cache(
+    name: str, frames: dict[str, pd.DataFrame], sources: list[str]
+) -> None:
+    manifest = {"version": CACHE_VERSION, "tables": list(frames), "sources": {}}
+    for path in sources:
+        stat = os.stat(path)
+        manifest["sources"][path] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": _sha256(path),
+        }
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        for table, frame in frames.items():
+            _publish(
+                _parquet_path(name, table),
+                lambda tmp_path: frame.to_parquet(tmp_path, index=False),
+            )
+        _write_manifest(name, manifest)
+    except (ImportError, OSError):
+        # Without pyarrow or a writable data directory we simply parse the
+        # CSV on every start, as before.
+        pass
+
+
+@lru_cache(maxsize=None)
+def _load_dynasties() -> pd.DataFrame:
+    return pd.read_csv(DYNASTIES_PATH, sep=";")
+
+
+def _prepare_rows() -> pd.DataFrame:
+    df = pd.read_csv(EDITIONS_PATH, sep=";")
+
+    df["publishDate"] = df["publishDate"].astype(int)
+    for column in STRING_COLUMNS:
+        df[column] = df[column].astype(str)
+
+    df = df.merge(_load_dynasties(), on="Printer", how="left")
+    for column in CATEGORICAL_COLUMNS:
+        df[column] = df[column].astype("category")
+
+    return df
+
+
+@lru_cache(maxsize=None)
+def _load_model() -> EditionModel:
+    sources = [EDITIONS_PATH, DYNASTIES_PATH]
+
+    tables = _read_cache("model", sources)
+    if tables is not None:
+        return freeze(
+            EditionModel(
+                editions=tables["editions"],
+                bridges={column: tables[column] for column in BRIDGE_COLUMNS},
+            )
+        )
+
+    model = build_model(_prepare_rows())
+    _write_cache("model", {"editions": model.editions, **model.bridges}, sources)
+    return freeze(model)
+
+
+def dynasties() -> pd.DataFrame:
+    """Printer to dynasty mapping from ``dynastie_přehled.csv``."""
+    return _load_dynasties().copy(deep=False)
+
+
+def model() -> EditionModel:
+    """Edition fact and bridge tables, loaded once per process.
+
+    The prepared tables are cached in ``CACHE_DIR`` and rebuilt whenever one
+    of the source CSV files changes. Facet columns (``CATEGORICAL_COLUMNS``)
+    are pandas categoricals; filter them through :mod:`knihtisk.codes` and
+    group them with ``observed=True``. The tables are shared by every caller
+    and their arrays are read-only; derive new frames instead of mutating
+    them.
+    """
+    return _load_model()
+
+
+def editions() -> pd.DataFrame:
+    """The edition fact table of :func:`model`, one row per edition and printer."""
+    return _load_model().editions.copy(deep=False)
+
+
+def labels(column: str) -> list:
+    """Distinct values of a facet column, from its category dictionary."""
+    model = _load_model()
+    table = model.bridges.get(column, model.editions)
+    return codes.labels(table[column])
+
+
+@lru_cache(maxsize=None)
+def facet_index() -> FacetIndex:
+    """Inverted index of the facet values of :func:`model`."""
+    return build_index(_load_model())
+
+
+@lru_cache(maxsize=None)
+def search_index(column: str) -> SearchIndex:
+    """Typeahead index of a facet column, ranked by distinct editions."""
+    model = _load_model()
+    ids = aggregate.key(model.editions["id"])
+    table = model.bridges.get(column, model.editions)
+    if column in model.bridges:
+        ids = ids.take(table["edition"].to_numpy())
+    groups = aggregate.groups(aggregate.key(table[column]))
+    counts = aggregate.distinct_count(groups, ids)
+    return build_search_index(table[column].cat.categories, counts)
+
+
+@lru_cache(maxsize=None)
+def printer_activity() -> PrinterActivity:
+    """First/last year, edition count and per-year histogram of every printer."""
+    return build_printer_activity(_load_model().editions)
+
+
+@lru_cache(maxsize=None)
+def cube() -> Cube:
+    """Edition counts of :func:`model` pre-aggregated by year, printer and dynasty."""
+    return build_cube(_load_model())
+
+
+@lru_cache(maxsize=None)
+def fingerprint(*paths: str) -> str:
+    """Content hash of the edition sources and of the extra files ``paths``."""
+    digest = hashlib.sha256()
+    for path in [EDITIONS_PATH, DYNASTIES_PATH, *paths]:
+        digest.update(_sha256(path).encode())
+    return digest.hexdigest()
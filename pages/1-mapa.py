@@ -1,27 +1,34 @@
+import json
+
+import flask
 import pandas as pd
 import folium
+from branca.element import MacroElement
 from folium.plugins import MarkerCluster
-import numpy as np
-import os
-import locale
+from folium.template import Template
 
 
 import dash
-from dash import dcc, html, callback
+from dash import dcc, html, callback, clientside_callback, ClientsideFunction
 from dash.dependencies import Input, Output
 
+from knihtisk import intervals, store
+from knihtisk.collation import sort_czech
+
 dash.register_page(__name__)
 
 DATA_PATH = "data/Tiskaři_souřadnice_mapa_dynastie.csv"
-DYNASTY_DATA_PATH = "data/dynastie_přehled.csv"
+
+# Seconds for which browsers may reuse a popup without asking again.
+POPUP_MAX_AGE = 3600
 
 geolocations = pd.read_csv(DATA_PATH, sep=";")
 geolocations["Lat"] = pd.to_numeric(geolocations["Lat"])
 geolocations["Lon"] = pd.to_numeric(geolocations["Lon"])
 
-dynasties = pd.read_csv(DYNASTY_DATA_PATH, sep=";")
+dynasties = store.dynasties()
 
-data = pd.read_csv("data/Data_knihtisk.csv", sep=";")
+data = store.editions()
 
 
 MIN_YEAR = data["publishDate"].min()
@@ -29,16 +36,10 @@ MAX_YEAR = data["publishDate"].max()
 
 geolocations = geolocations.merge(dynasties, on="Printer", how="left")
 
-geolocations["publishDatefrom"] = np.nan
-geolocations["publishDateto"] = np.nan
-
-for index, row in geolocations.iterrows():
-    printer = row["Printer"]
-    min_date = data[data["Printer"] == printer]["publishDate"].min()
-    max_date = data[data["Printer"] == printer]["publishDate"].max()
+activity = store.printer_activity().summary
 
-    geolocations.loc[index, "publishDatefrom"] = min_date
-    geolocations.loc[index, "publishDateto"] = max_date
+geolocations["publishDatefrom"] = geolocations["Printer"].map(activity["first_year"])
+geolocations["publishDateto"] = geolocations["Printer"].map(activity["last_year"])
 
 geolocations.fillna({"publishDatefrom": 0}, inplace=True)
 geolocations.fillna({"publishDateto": 0}, inplace=True)
@@ -46,12 +47,23 @@ geolocations.fillna({"publishDateto": 0}, inplace=True)
 geolocations["publishDatefrom"] = geolocations["publishDatefrom"].astype(int)
 geolocations["publishDateto"] = geolocations["publishDateto"].astype(int)
 
-DEFAULT_LOCATION = [geolocations["Lat"].mean(), geolocations["Lon"].mean()]
+# Years in which the printer worked at the address: a single year when only
+# the start is known, and the printer's years of publishing when neither is.
+geolocations["periodfrom"] = (
+    geolocations["Období od"].fillna(geolocations["publishDatefrom"]).astype(int)
+)
+geolocations["periodto"] = (
+    geolocations["Období do"]
+    .fillna(geolocations["Období od"])
+    .fillna(geolocations["publishDateto"])
+    .astype(int)
+)
 
-locale.setlocale(locale.LC_ALL, 'cs_CZ.UTF-8')
+address_periods = intervals.build_interval_tree(
+    geolocations["periodfrom"], geolocations["periodto"], geolocations.index
+)
 
-def sort_czech(items, key=lambda x:x):
-    return sorted(items, key=lambda x:locale.strxfrm(key(x)))
+DEFAULT_LOCATION = [geolocations["Lat"].mean(), geolocations["Lon"].mean()]
 
 
 hex_colors = [
@@ -77,72 +89,205 @@ dynasty_colors = {
     for i, dynasty in enumerate(geolocations["Dynastie"].dropna().unique())
 }
 
-if not os.path.exists("mapa.html"):
-    with open("mapa.html", "w") as f:
-        f.write("")
+ICON_HTML = """
+<div style="background-color:{color}; width:24px; height:24px; border-radius:50%; display:flex; align-items:center; justify-content:center;">
+    <i class="fas fa-book-open" style="color:white;"></i>
+</div>
+"""
 
 
-def create_map(geolocations):
-    if len(geolocations) == 0:
-        location = DEFAULT_LOCATION
-    else:
-        location = [geolocations["Lat"].mean(), geolocations["Lon"].mean()]
+def popup_html(row) -> str:
+    popup = (
+        f"<div style='width: 250px;'><strong>Tiskař:</strong> {row['Printer']}<br>"
+    )
 
-    mymap = folium.Map(location=location, zoom_start=15)
+    if not pd.isnull(row["Činnost samostatná"]):
+        popup += (
+            f"<strong>Samostatná činnost:</strong> {row['Činnost samostatná']}<br>"
+        )
 
-    cluster_radius = 10
+    if not pd.isnull(row["Činnost závislá"]):
+        popup += f"<strong>Činnost závislá:</strong> {row['Činnost závislá']}<br>"
 
-    marker_cluster = MarkerCluster(maxClusterRadius=cluster_radius).add_to(mymap)
+    if not pd.isnull(row["Adresa"]):
+        popup += f"<strong>Adresa:</strong> {row['Adresa']}<br>"
+
+    if not pd.isnull(row["Období"]):
+        popup += f"<strong>Umístění tiskárny na této adrese:</strong> {row['Období']}<br>"
+
+    popup += "<br>"
 
+    if not pd.isnull(row["Encyklopedie knihy"]):
+        popup += f"<a target='_top' href= '{row['Encyklopedie knihy']}'>{'Encyklopedie knihy'}</a><br>"
+
+    if not pd.isnull(row["Poznámka o encyklopedii"]):
+        popup += f"{row['Poznámka o encyklopedii']}<br>"
+
+    if not pd.isnull(row["Bibliografická databáze"]):
+        popup += f"<a target='_top' href= '{row['Bibliografická databáze']}'>{'Bibliografická databáze'}</a><br>"
+
+    return popup
+
+
+def tooltip_html(row) -> str:
+    tooltip = f"<strong>{row['Printer']}</strong><br>"
+    if not pd.isnull(row["Období"]):
+        tooltip += f"Období: {row['Období']}<br>"
+    return tooltip
+
+
+def to_javascript(value) -> str:
+    # JSON is valid JavaScript; "<" is escaped so no text can close the script.
+    return json.dumps(value, ensure_ascii=False).replace("<", "\\u003c")
+
+
+def address_features(geolocations) -> dict:
+    """GeoJSON of the addresses, with what their markers show.
+
+    The addresses are filtered on the server (:func:`select_addresses`), so
+    the features carry only the marker's color and tooltip.
+    """
+    features = []
     for index, row in geolocations.iterrows():
-        popup = (
-            f"<div style='width: 250px;'><strong>Tiskař:</strong> {row['Printer']}<br>"
+        features.append(
+            {
+                "type": "Feature",
+                "id": int(index),
+                "geometry": {"type": "Point", "coordinates": [row["Lon"], row["Lat"]]},
+                "properties": {
+                    "color": dynasty_colors.get(row["Dynastie"], "#228B22"),
+                    "tooltip": tooltip_html(row),
+                },
+            }
         )
+    return {"type": "FeatureCollection", "features": features}
+
+
+class AddressLayer(MacroElement):
+    """Markers of every address, in their parent cluster.
+
+    The layer shows the addresses whose ids the page posts to the map as
+    ``{"mapaAddresses": [...]}``, and asks for them with a "mapa-ready"
+    message once its markers are built (see ``assets/1-mapa.js``). Popups
+    are fetched from ``popup_url`` followed by the address id when they are
+    first opened.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            (function () {
+                var cluster = {{ this._parent.get_name() }};
+                var icon = {{ this.icon }};
+                var popupUrl = {{ this.popup_url }};
+                var markers = {};
+
+                function loadPopup(marker, id) {
+                    if (marker.popupLoaded) {
+                        return;
+                    }
+                    fetch(popupUrl + id)
+                        .then(function (response) {
+                            if (!response.ok) {
+                                throw new Error(response.statusText);
+                            }
+                            return response.text();
+                        })
+                        .then(function (html) {
+                            marker.popupLoaded = true;
+                            marker.setPopupContent(html);
+                        })
+                        .catch(function () {
+                            // Left unloaded, so the next opening tries again.
+                            marker.setPopupContent({{ this.failed }});
+                        });
+                }
+
+                L.geoJSON({{ this.features }}, {
+                    pointToLayer: function (feature, latlng) {
+                        var properties = feature.properties;
+                        var marker = L.marker(latlng, {
+                            icon: L.divIcon({
+                                html: icon.replace("{color}", properties.color),
+                                className: "empty",
+                            }),
+                        });
+                        marker.bindPopup({{ this.loading }}, {maxWidth: "100%"});
+                        marker.on("popupopen", function () {
+                            loadPopup(marker, feature.id);
+                        });
+                        marker.bindTooltip(properties.tooltip, {sticky: true});
+                        markers[feature.id] = marker;
+                        return marker;
+                    },
+                });
+
+                function show(ids) {
+                    cluster.clearLayers();
+                    cluster.addLayers(ids.map(function (id) {
+                        return markers[id];
+                    }));
+                }
+
+                window.addEventListener("message", function (event) {
+                    var data = event.data;
+                    if (event.source === window.parent && data && data.mapaAddresses) {
+                        show(data.mapaAddresses);
+                    }
+                });
+                cluster.addLayers(Object.values(markers));
+                window.parent.postMessage("mapa-ready", "*");
+            })();
+        {% endmacro %}
+        """
+    )
 
-        if not pd.isnull(row["Činnost samostatná"]):
-            popup += (
-                f"<strong>Samostatná činnost:</strong> {row['Činnost samostatná']}<br>"
-            )
+    def __init__(self, features: dict, popup_url: str):
+        super().__init__()
+        self._name = "AddressLayer"
+        self.features = to_javascript(features)
+        self.icon = to_javascript(ICON_HTML)
+        self.popup_url = to_javascript(popup_url)
+        self.loading = to_javascript("Načítání…")
+        self.failed = to_javascript("Informace se nepodařilo načíst.")
 
-        if not pd.isnull(row["Činnost závislá"]):
-            popup += f"<strong>Činnost závislá:</strong> {row['Činnost závislá']}<br>"
 
-        if not pd.isnull(row["Adresa"]):
-            popup += f"<strong>Adresa:</strong> {row['Adresa']}<br>"
+def create_map(geolocations):
+    """The map page's document: every address, centered on all of them."""
+    mymap = folium.Map(location=DEFAULT_LOCATION, zoom_start=15)
 
-        if not pd.isnull(row["Období"]):
-            popup += f"<strong>Umístění tiskárny na této adrese:</strong> {row['Období']}<br>"
+    cluster_radius = 10
 
-        popup += "<br>"
+    marker_cluster = MarkerCluster(maxClusterRadius=cluster_radius).add_to(mymap)
+    AddressLayer(address_features(geolocations), POPUP_URL).add_to(marker_cluster)
 
-        if not pd.isnull(row["Encyklopedie knihy"]):
-            popup += f"<a target='_top' href= '{row['Encyklopedie knihy']}'>{'Encyklopedie knihy'}</a><br>"
+    return mymap.get_root().render()
 
-        if not pd.isnull(row["Poznámka o encyklopedii"]):
-            popup += f"{row['Poznámka o encyklopedii']}<br>"
 
-        if not pd.isnull(row["Bibliografická databáze"]):
-            popup += f"<a target='_top' href= '{row['Bibliografická databáze']}'>{'Bibliografická databáze'}</a><br>"
+# Popups are only sent when opened; most markers never are.
+popups = {int(index): popup_html(row) for index, row in geolocations.iterrows()}
 
-        tooltip = f"<strong>{row['Printer']}</strong><br>"
-        if not pd.isnull(row["Období"]):
-            tooltip += f"Období: {row['Období']}<br>"
+# The server routes the popups under the app's routes prefix, and browsers
+# request them under its requests prefix, like every other Dash route.
+app = dash.get_app()
+POPUP_PATH = "mapa/popup/"
+POPUP_URL = app.config.requests_pathname_prefix + POPUP_PATH
 
-        color = dynasty_colors.get(row["Dynastie"], "#228B22")
 
-        icon_html = f"""
-        <div style="background-color:{color}; width:24px; height:24px; border-radius:50%; display:flex; align-items:center; justify-content:center;">
-            <i class="fas fa-book-open" style="color:white;"></i>
-        </div>
-        """
-        icon = folium.DivIcon(html=icon_html)
+@app.server.route(app.config.routes_pathname_prefix + POPUP_PATH + "<int:address>")
+def address_popup(address: int):
+    if address not in popups:
+        flask.abort(404)
+    response = flask.make_response(popups[address])
+    response.cache_control.public = True
+    response.cache_control.max_age = POPUP_MAX_AGE
+    response.add_etag()
+    return response.make_conditional(flask.request)
 
-        folium.Marker(
-            location=[row["Lat"], row["Lon"]], popup=popup, tooltip=tooltip, icon=icon
-        ).add_to(marker_cluster)
 
-    mymap.save("mapa.html")
-    return open("mapa.html", encoding="UTF-8").read()
+# Filters only change which markers the map shows, so the document is built
+# once and the browser keeps its zoom and position.
+MAP_DOCUMENT = create_map(geolocations)
 
 
 layout = html.Div(
@@ -242,9 +387,10 @@ layout = html.Div(
         html.Div(
             id="map-container",
             children=[
+                dcc.Store(id="map-addresses"),
                 html.Iframe(
                     id="mapa",
-                    srcDoc=open("mapa.html", "r", encoding="UTF-8").read(),
+                    srcDoc=MAP_DOCUMENT,
                     style={
                         "width": "100%",
                         "height": "100%",
@@ -277,23 +423,12 @@ layout = html.Div(
 )
 
 
-@callback(
-    Output("mapa", "srcDoc"),
-    Input("printer_dropdown", "value"),
-    Input("dynasty_dropdown", "value"),
-    Input("year-range-slider", "value"),
-)
-def listen_events(
+def select_addresses(
     printers: list[str], dynasties: list[str], year_range: tuple[int, int]
-):
-    subframe = geolocations.copy()
-
+) -> list[int]:
     year_min, year_max = year_range
-    subframe = geolocations[
-        ~(
-            (geolocations["publishDateto"] < year_min)
-            | (geolocations["publishDatefrom"] > year_max)
-        )
+    subframe = geolocations.loc[
+        intervals.overlapping(address_periods, year_min, year_max)
     ]
 
     if printers and dynasties:
@@ -310,4 +445,23 @@ def listen_events(
     elif dynasties:
         subframe = subframe[subframe["Dynastie"].isin(dynasties)]
 
-    return create_map(subframe)
+    return subframe.index.tolist()
+
+
+@callback(
+    Output("map-addresses", "data"),
+    Input("printer_dropdown", "value"),
+    Input("dynasty_dropdown", "value"),
+    Input("year-range-slider", "value"),
+)
+def listen_events(
+    printers: list[str], dynasties: list[str], year_range: tuple[int, int]
+):
+    return select_addresses(printers, dynasties, year_range)
+
+
+# The ids are posted to the map, which shows their markers without reloading.
+clientside_callback(
+    ClientsideFunction(namespace="mapa", function_name="show_addresses"),
+    Input("map-addresses", "data"),
+)
@@ -1,50 +1,26 @@
+import base64
+import numpy as np
 import pandas as pd
-import prince
 import plotly.graph_objects as go
 import plotly.express as px
-import locale
 
-from dash import dcc, html, callback
+from dash import dcc, html, callback, clientside_callback
 import dash
-from dash.dependencies import Input, Output
+from dash.dependencies import ClientsideFunction, Input, Output, State
 
-dash.register_page(__name__)
+from knihtisk import correspondence, facets, query, resultcache, search, store
+from knihtisk.collation import sort_czech
 
-df = pd.read_csv("data/Data_knihtisk.csv", sep=";")
-dynasties = pd.read_csv("data/dynastie_přehled.csv", sep=";")
+dash.register_page(__name__)
 
-df["publishDate"] = df["publishDate"].astype(int)
-df["Printer"] = df["Printer"].astype(str)
-df["genre"] = df["genre"].astype(str)
-df["topic"] = df["topic"].astype(str)
-df["author"] = df["author"].astype(str)
-df["id"] = df["id"].astype(str)
-df["language_cs"] = df["language_cs"].astype(str)
-df["author"] = df["author"].astype(str)
+index = store.facet_index()
+cube = store.cube()
+df = index.model.editions
+dynasties = store.dynasties()
 
 MIN_YEAR = df["publishDate"].min()
 MAX_YEAR = df["publishDate"].max()
 
-df = df.merge(dynasties, on="Printer", how="left")
-
-language_options = [
-    {"label": lang, "value": lang}
-    for lang in df["language_cs"].unique()
-    if pd.notna(lang)
-]
-genre_options = [
-    {"label": lang, "value": lang} for lang in df["genre"].unique() if pd.notna(lang)
-]
-topic_options = [
-    {"label": lang, "value": lang} for lang in df["topic"].unique() if pd.notna(lang)
-]
-author_options = [
-    {"label": lang, "value": lang} for lang in df["author"].unique() if pd.notna(lang)
-]
-
-def sort_czech(items, key=lambda x:x):
-    return sorted(items, key=lambda x:locale.strxfrm(key(x)))
-
 layout = html.Div(
     [
         html.Div(
@@ -68,7 +44,7 @@ layout = html.Div(
                     id="printer-dropdown",
                     options=[
                         {"label": printer, "value": printer}
-                        for printer in sort_czech(df["Printer"].unique())
+                        for printer in sort_czech(store.labels("Printer"))
                     ],
                     value=None,
                     multi=True,
@@ -96,10 +72,7 @@ layout = html.Div(
                 html.Label("Výběr autora:"),
                 dcc.Dropdown(
                     id="author-dropdown",
-                    options=[
-                        {"label": author, "value": author}
-                        for author in sort_czech(df["author"].unique())
-                    ],
+                    options=[],
                     value=None,
                     multi=True,
                 ),
@@ -113,7 +86,7 @@ layout = html.Div(
                     id="language-dropdown",
                     options=[
                         {"label": language, "value": language}
-                        for language in sort_czech(df["language_cs"].unique())
+                        for language in sort_czech(store.labels("language_cs"))
                     ],
                     value=None,
                     multi=True,
@@ -128,7 +101,7 @@ layout = html.Div(
                     id="genre-dropdown",
                     options=[
                         {"label": genre, "value": genre}
-                        for genre in sort_czech(df["genre"].unique())
+                        for genre in sort_czech(store.labels("genre"))
                     ],
                     value=None,
                     multi=True,
@@ -143,7 +116,7 @@ layout = html.Div(
                     id="topic-dropdown",
                     options=[
                         {"label": topic, "value": topic}
-                        for topic in sort_czech(df["topic"].unique())
+                        for topic in sort_czech(store.labels("topic"))
                     ],
                     value=None,
                     multi=True,
@@ -164,6 +137,7 @@ layout = html.Div(
                     value=1,
                     labelStyle={"display": "inline-block"},
                 ),
+                dcc.Store(id="year-series"),
             ],
             style={"margin": "10px"},
         ),
@@ -197,45 +171,99 @@ layout = html.Div(
     ]
 )
 
-def filter_table(
-    df,
+# Every dropdown offers the values that still have editions under the other
+# selections, with their number of editions.
+FACET_DROPDOWNS = [
+    ("printer-dropdown", "Printer"),
+    ("dynasty-dropdown", "Dynastie"),
+    ("language-dropdown", "language_cs"),
+    ("genre-dropdown", "genre"),
+    ("topic-dropdown", "topic"),
+]
+
+
+@callback(
+    [Output(dropdown_id, "options") for dropdown_id, _ in FACET_DROPDOWNS],
+    Input("year-range-slider", "value"),
+    Input("printer-dropdown", "value"),
+    Input("dynasty-dropdown", "value"),
+    Input("author-dropdown", "value"),
+    Input("language-dropdown", "value"),
+    Input("genre-dropdown", "value"),
+    Input("topic-dropdown", "value"),
+)
+def update_facet_options(*filters):
+    key = query.filter_key(*filters)
+    selections = dict(zip(query.FILTER_COLUMNS, key[2:]))
+    columns = [column for _, column in FACET_DROPDOWNS]
+    counts = facets.facet_counts(index, key, columns)
+    return [
+        facets.options(index, column, counts[column], selections[column])
+        for column in columns
+    ]
+# Authors are searched on the server, which sends the most productive first.
+
+# Authors are searched on the server and listed most productive first.
+@callback(
+    Output("author-dropdown", "options"),
+    Input("author-dropdown", "search_value"),
+    Input("author-dropdown", "value"),
+    Input("year-range-slider", "value"),
+    Input("printer-dropdown", "value"),
+    Input("dynasty-dropdown", "value"),
+    Input("language-dropdown", "value"),
+    Input("genre-dropdown", "value"),
+    Input("topic-dropdown", "value"),
+)
+def search_authors(
+    search_value,
+    selected_author,
     selected_year_range,
     selected_printer,
     selected_dynasty,
-    selected_author,
     selected_language,
     selected_genre,
     selected_topic,
 ):
-    filtered_df = df[
-        (df["publishDate"] >= selected_year_range[0])
-        & (df["publishDate"] <= selected_year_range[1])
-    ]
-
-    if selected_printer:
-        filtered_df = filtered_df[filtered_df["Printer"].isin(selected_printer)]
-
-    if selected_dynasty:
-        filtered_df = filtered_df[filtered_df["Dynastie"].isin(selected_dynasty)]
-
-    if selected_author:
-        filtered_df = filtered_df[filtered_df["author"].isin(selected_author)]
-
-    if selected_language:
-        filtered_df = filtered_df[filtered_df["language_cs"].isin(selected_language)]
-
-    if selected_genre:
-        filtered_df = filtered_df[filtered_df["genre"].isin(selected_genre)]
+    key = query.filter_key(
+        selected_year_range,
+        selected_printer,
+        selected_dynasty,
+        selected_author,
+        selected_language,
+        selected_genre,
+        selected_topic,
+    )
+    counts = facets.facet_counts(index, key, ["author"])["author"]
+    return search.options(
+        store.search_index("author"), search_value, selected_author, counts
+    )
 
-    if selected_topic:
-        filtered_df = filtered_df[filtered_df["topic"].isin(selected_topic)]
 
-    filtered_df = filtered_df.drop_duplicates(
-        subset=["id", "Printer", "author", "language_cs", "genre", "topic", "Dynastie"]
+def filter_table(
+    index,
+    selected_year_range,
+    selected_printer,
+    selected_dynasty,
+    selected_author,
+    selected_language,
+    selected_genre,
+    selected_topic,
+    session=None,
+):
+    return query.summarize(
+        index,
+        cube,
+        selected_year_range,
+        printers=selected_printer,
+        dynasties=selected_dynasty,
+        authors=selected_author,
+        languages=selected_language,
+        genres=selected_genre,
+        topics=selected_topic,
+        session=session,
     )
 
-    return filtered_df
-
 def compute_dtick(table) -> int:
     x_length = len(table["publishDate"].unique())
     return x_length // min(max(1, x_length), 10)
@@ -361,18 +389,7 @@ topic_colors = {
     "alchymie": "#6D8F5D",
 }
 
-# Define callback to update bar chart
-@callback(
-    Output("book-count-by-year", "figure"),
-    Input("year-range-slider", "value"),
-    Input("printer-dropdown", "value"),
-    Input("dynasty-dropdown", "value"),
-    Input("author-dropdown", "value"),
-    Input("language-dropdown", "value"),
-    Input("genre-dropdown", "value"),
-    Input("topic-dropdown", "value"),
-    Input("year-interval-checklist", "value"),
-)
+# Build the bar chart
 def update_book_count_by_year(
     selected_year_range,
     selected_printer,
@@ -381,10 +398,9 @@ def update_book_count_by_year(
     selected_language,
     selected_genre,
     selected_topic,
-    selected_interval,
 ):
-    filtered_df = filter_table(
-        df,
+    selection = filter_table(
+        index,
         selected_year_range,
         selected_printer,
         selected_dynasty,
@@ -394,15 +410,12 @@ def update_book_count_by_year(
         selected_topic,
     )
 
-    filtered_df["interval"] = (
-        filtered_df["publishDate"] // selected_interval
-    ) * selected_interval
-    interval_counts = filtered_df.groupby("interval")["id"].nunique().reset_index()
-    interval_counts.columns = ["publishDate", "count"]
+    year_counts = query.distinct_counts(selection, "publishDate")
+    year_counts.columns = ["publishDate", "count"]
 
     fig = go.Figure(layout=dict(template="plotly"))
     fig = px.bar(
-        interval_counts,
+        year_counts,
         x="publishDate",
         y="count",
         title="",
@@ -417,7 +430,7 @@ def update_book_count_by_year(
         xaxis_type="category",
         xaxis=dict(
             tickmode="linear",
-            dtick=compute_dtick(interval_counts),
+            dtick=compute_dtick(year_counts),
         ),
         margin=dict(l=50, r=50, t=50, b=50),
     )
@@ -425,17 +438,7 @@ def update_book_count_by_year(
     return fig
 
 
-# Define callback to update line chart
-@callback(
-    Output("book-count-by-year-line", "figure"),
-    Input("year-range-slider", "value"),
-    Input("printer-dropdown", "value"),
-    Input("dynasty-dropdown", "value"),
-    Input("author-dropdown", "value"),
-    Input("language-dropdown", "value"),
-    Input("genre-dropdown", "value"),
-    Input("topic-dropdown", "value"),
-)
+# Build the line chart
 def update_book_count_by_year_line(
     selected_year_range,
     selected_printer,
@@ -445,8 +448,8 @@ def update_book_count_by_year_line(
     selected_genre,
     selected_topic,
 ):
-    filtered_df = filter_table(
-        df,
+    selection = filter_table(
+        index,
         selected_year_range,
         selected_printer,
         selected_dynasty,
@@ -456,7 +459,7 @@ def update_book_count_by_year_line(
         selected_topic,
     )
 
-    year_counts = filtered_df.groupby("publishDate")["id"].nunique().reset_index()
+    year_counts = query.distinct_counts(selection, "publishDate")
     year_counts.columns = ["publishDate", "count"]
 
     fig = px.line(
@@ -485,18 +488,7 @@ def update_book_count_by_year_line(
 
     return fig
 
-# Define callback to update stacked langauges chart
-@callback(
-    Output("book-count-by-year-language", "figure"),
-    Input("year-range-slider", "value"),
-    Input("printer-dropdown", "value"),
-    Input("dynasty-dropdown", "value"),
-    Input("author-dropdown", "value"),
-    Input("language-dropdown", "value"),
-    Input("genre-dropdown", "value"),
-    Input("topic-dropdown", "value"),
-    Input("year-interval-checklist", "value"),
-)
+# Build the stacked langauges chart
 def update_book_count_by_year_language(
     selected_year_range,
     selected_printer,
@@ -505,10 +497,9 @@ def update_book_count_by_year_language(
     selected_language,
     selected_genre,
     selected_topic,
-    selected_interval,
 ):
-    filtered_df = filter_table(
-        df,
+    selection = filter_table(
+        index,
         selected_year_range,
         selected_printer,
         selected_dynasty,
@@ -518,25 +509,14 @@ def update_book_count_by_year_language(
         selected_topic,
     )
 
-    filtered_df["language_score"] = 1 / filtered_df.groupby("id")[
-        "language_cs"
-    ].transform("count")
-
-    filtered_df["interval"] = (
-        filtered_df["publishDate"] // selected_interval
-    ) * selected_interval
-    interval_counts = (
-        filtered_df.groupby(["interval", "language_cs"])
-        .agg({"language_score": "sum"})
-        .reset_index()
-    )
-    interval_counts.columns = ["publishDate", "language_cs", "count"]
+    year_counts = query.fractional_counts(selection, "publishDate", "language_cs")
+    year_counts.columns = ["publishDate", "language_cs", "count"]
 
-    interval_counts = interval_counts.sort_values(by="publishDate")
+    year_counts = year_counts.sort_values(by="publishDate")
 
     fig = go.Figure(layout=dict(template="plotly"))
     fig = px.bar(
-        interval_counts,
+        year_counts,
         x="publishDate",
         y="count",
         color="language_cs",
@@ -557,24 +537,13 @@ def update_book_count_by_year_language(
         xaxis=dict(
             categoryorder="category ascending",
             tickmode="linear",
-            dtick=compute_dtick(interval_counts),
+            dtick=compute_dtick(year_counts),
         ),
     )
 
     return fig
 
-# Define callback to update stacked genres chart
-@callback(
-    Output("book-count-by-year-genre", "figure"),
-    Input("year-range-slider", "value"),
-    Input("printer-dropdown", "value"),
-    Input("dynasty-dropdown", "value"),
-    Input("author-dropdown", "value"),
-    Input("language-dropdown", "value"),
-    Input("genre-dropdown", "value"),
-    Input("topic-dropdown", "value"),
-    Input("year-interval-checklist", "value"),
-)
+# Build the stacked genres chart
 def update_book_count_by_year_genre(
     selected_year_range,
     selected_printer,
@@ -583,10 +552,9 @@ def update_book_count_by_year_genre(
     selected_language,
     selected_genre,
     selected_topic,
-    selected_interval,
 ):
-    filtered_df = filter_table(
-        df,
+    selection = filter_table(
+        index,
         selected_year_range,
         selected_printer,
         selected_dynasty,
@@ -596,25 +564,14 @@ def update_book_count_by_year_genre(
         selected_topic,
     )
 
-    filtered_df["genre_score"] = 1 / filtered_df.groupby("id")["genre"].transform(
-        "count"
-    )
-
-    filtered_df["interval"] = (
-        filtered_df["publishDate"] // selected_interval
-    ) * selected_interval
-    interval_counts = (
-        filtered_df.groupby(["interval", "genre"])
-        .agg({"genre_score": "sum"})
-        .reset_index()
-    )
-    interval_counts.columns = ["publishDate", "genre", "count"]
+    year_counts = query.fractional_counts(selection, "publishDate", "genre")
+    year_counts.columns = ["publishDate", "genre", "count"]
 
-    interval_counts = interval_counts.sort_values(by="publishDate")
+    year_counts = year_counts.sort_values(by="publishDate")
 
     fig = go.Figure(layout=dict(template="plotly"))
     fig = px.bar(
-        interval_counts,
+        year_counts,
         x="publishDate",
         y="count",
         color="genre",
@@ -635,24 +592,13 @@ def update_book_count_by_year_genre(
         xaxis=dict(
             categoryorder="category ascending",
             tickmode="linear",
-            dtick=compute_dtick(interval_counts),
+            dtick=compute_dtick(year_counts),
         ),
     )
 
     return fig
 
-# Define callback to update stacked topics chart
-@callback(
-    Output("book-count-by-year-topic", "figure"),
-    Input("year-range-slider", "value"),
-    Input("printer-dropdown", "value"),
-    Input("dynasty-dropdown", "value"),
-    Input("author-dropdown", "value"),
-    Input("language-dropdown", "value"),
-    Input("genre-dropdown", "value"),
-    Input("topic-dropdown", "value"),
-    Input("year-interval-checklist", "value"),
-)
+# Build the stacked topics chart
 def update_book_count_by_year_topic(
     selected_year_range,
     selected_printer,
@@ -661,10 +607,9 @@ def update_book_count_by_year_topic(
     selected_language,
     selected_genre,
     selected_topic,
-    selected_interval,
 ):
-    filtered_df = filter_table(
-        df,
+    selection = filter_table(
+        index,
         selected_year_range,
         selected_printer,
         selected_dynasty,
@@ -674,25 +619,14 @@ def update_book_count_by_year_topic(
         selected_topic,
     )
 
-    filtered_df["topic_score"] = 1 / filtered_df.groupby("id")["topic"].transform(
-        "count"
-    )
+    year_counts = query.fractional_counts(selection, "publishDate", "topic")
+    year_counts.columns = ["publishDate", "topic", "count"]
 
-    filtered_df["interval"] = (
-        filtered_df["publishDate"] // selected_interval
-    ) * selected_interval
-    interval_counts = (
-        filtered_df.groupby(["interval", "topic"])
-        .agg({"topic_score": "sum"})
-        .reset_index()
-    )
-    interval_counts.columns = ["publishDate", "topic", "count"]
-
-    interval_counts = interval_counts.sort_values(by="publishDate")
+    year_counts = year_counts.sort_values(by="publishDate")
 
     fig = go.Figure(layout=dict(template="plotly"))
     fig = px.bar(
-        interval_counts,
+        year_counts,
         x="publishDate",
         y="count",
         color="topic",
@@ -713,23 +647,13 @@ def update_book_count_by_year_topic(
         xaxis=dict(
             categoryorder="category ascending",
             tickmode="linear",
-            dtick=compute_dtick(interval_counts),
+            dtick=compute_dtick(year_counts),
         ),
     )
 
     return fig
 
-# Define callback to update book count by dynasty chart
-@callback(
-    Output("book-count-by-dynasty", "figure"),
-    Input("year-range-slider", "value"),
-    Input("printer-dropdown", "value"),
-    Input("dynasty-dropdown", "value"),
-    Input("author-dropdown", "value"),
-    Input("language-dropdown", "value"),
-    Input("genre-dropdown", "value"),
-    Input("topic-dropdown", "value"),
-)
+# Build the book count by dynasty chart
 def update_book_count_by_dynasty(
     selected_year_range,
     selected_printer,
@@ -739,8 +663,8 @@ def update_book_count_by_dynasty(
     selected_genre,
     selected_topic,
 ):
-    filtered_df = filter_table(
-        df,
+    selection = filter_table(
+        index,
         selected_year_range,
         selected_printer,
         selected_dynasty,
@@ -750,15 +674,11 @@ def update_book_count_by_dynasty(
         selected_topic,
     )
 
-    dynasty_counts = filtered_df.groupby("Dynastie")["id"].nunique().reset_index()
+    dynasty_counts = query.distinct_counts(selection, "Dynastie")
     dynasty_counts.columns = ["Dynastie", "count"]
 
     dynasty_counts = dynasty_counts.sort_values(by="count", ascending=False)
 
-    dynasty_counts = dynasty_counts[
-        dynasty_counts["Dynastie"].isin(filtered_df["Dynastie"].unique())
-    ]
-
     total_count = dynasty_counts["count"].sum()
     dynasty_counts["percentage"] = (dynasty_counts["count"] / total_count) * 100
     dynasty_counts["totalpercentage"] = (dynasty_counts["count"] / 9698) * 100
@@ -787,17 +707,7 @@ def update_book_count_by_dynasty(
     return fig
 
 
-# Define callback to update stacked dynasties langauges chart
-@callback(
-    Output("book-count-by-dynasty-language", "figure"),
-    Input("year-range-slider", "value"),
-    Input("printer-dropdown", "value"),
-    Input("dynasty-dropdown", "value"),
-    Input("author-dropdown", "value"),
-    Input("language-dropdown", "value"),
-    Input("genre-dropdown", "value"),
-    Input("topic-dropdown", "value"),
-)
+# Build the stacked dynasties langauges chart
 def update_book_count_by_dynasty_language(
     selected_year_range,
     selected_printer,
@@ -807,8 +717,8 @@ def update_book_count_by_dynasty_language(
     selected_genre,
     selected_topic,
 ):
-    filtered_df = filter_table(
-        df,
+    selection = filter_table(
+        index,
         selected_year_range,
         selected_printer,
         selected_dynasty,
@@ -818,14 +728,8 @@ def update_book_count_by_dynasty_language(
         selected_topic,
     )
 
-    filtered_df["language_score"] = 1 / filtered_df.groupby(["Dynastie", "id"])[
-        "language_cs"
-    ].transform("count")
-
-    dynasty_counts = (
-        filtered_df.groupby(["Dynastie", "language_cs"])
-        .agg({"language_score": "sum"})
-        .reset_index()
+    dynasty_counts = query.fractional_counts(
+        selection, "Dynastie", "language_cs", per=["Dynastie", "id"]
     )
     dynasty_counts.columns = ["Dynastie", "language_cs", "count"]
 
@@ -858,17 +762,7 @@ def update_book_count_by_dynasty_language(
     return fig
 
 
-# Define callback to update stacked dynasties genres chart
-@callback(
-    Output("book-count-by-dynasty-genre", "figure"),
-    Input("year-range-slider", "value"),
-    Input("printer-dropdown", "value"),
-    Input("dynasty-dropdown", "value"),
-    Input("author-dropdown", "value"),
-    Input("language-dropdown", "value"),
-    Input("genre-dropdown", "value"),
-    Input("topic-dropdown", "value"),
-)
+# Build the stacked dynasties genres chart
 def update_book_count_by_dynasty_genre(
     selected_year_range,
     selected_printer,
@@ -878,8 +772,8 @@ def update_book_count_by_dynasty_genre(
     selected_genre,
     selected_topic,
 ):
-    filtered_df = filter_table(
-        df,
+    selection = filter_table(
+        index,
         selected_year_range,
         selected_printer,
         selected_dynasty,
@@ -889,15 +783,7 @@ def update_book_count_by_dynasty_genre(
         selected_topic,
     )
 
-    filtered_df["genre_score"] = 1 / filtered_df.groupby("id")["genre"].transform(
-        "count"
-    )
-
-    dynasty_counts = (
-        filtered_df.groupby(["Dynastie", "genre"])
-        .agg({"genre_score": "sum"})
-        .reset_index()
-    )
+    dynasty_counts = query.fractional_counts(selection, "Dynastie", "genre")
     dynasty_counts.columns = ["Dynastie", "genre", "count"]
 
     dynasty_counts = dynasty_counts.sort_values(by="Dynastie")
@@ -930,17 +816,7 @@ def update_book_count_by_dynasty_genre(
 
     return fig
 
-# Define callback to update stacked dynasties topics chart
-@callback(
-    Output("book-count-by-dynasty-topic", "figure"),
-    Input("year-range-slider", "value"),
-    Input("printer-dropdown", "value"),
-    Input("dynasty-dropdown", "value"),
-    Input("author-dropdown", "value"),
-    Input("language-dropdown", "value"),
-    Input("genre-dropdown", "value"),
-    Input("topic-dropdown", "value"),
-)
+# Build the stacked dynasties topics chart
 def update_book_count_by_dynasty_topic(
     selected_year_range,
     selected_printer,
@@ -950,8 +826,8 @@ def update_book_count_by_dynasty_topic(
     selected_genre,
     selected_topic,
 ):
-    filtered_df = filter_table(
-        df,
+    selection = filter_table(
+        index,
         selected_year_range,
         selected_printer,
         selected_dynasty,
@@ -961,15 +837,7 @@ def update_book_count_by_dynasty_topic(
         selected_topic,
     )
 
-    filtered_df["topic_score"] = 1 / filtered_df.groupby("id")["topic"].transform(
-        "count"
-    )
-
-    dynasty_counts = (
-        filtered_df.groupby(["Dynastie", "topic"])
-        .agg({"topic_score": "sum"})
-        .reset_index()
-    )
+    dynasty_counts = query.fractional_counts(selection, "Dynastie", "topic")
     dynasty_counts.columns = ["Dynastie", "topic", "count"]
 
     dynasty_counts = dynasty_counts.sort_values(by="Dynastie")
@@ -1003,17 +871,7 @@ def update_book_count_by_dynasty_topic(
     return fig
 
 
-# Define callback to update book count by printer chart
-@callback(
-    Output("book-count-by-printer", "figure"),
-    Input("year-range-slider", "value"),
-    Input("printer-dropdown", "value"),
-    Input("dynasty-dropdown", "value"),
-    Input("author-dropdown", "value"),
-    Input("language-dropdown", "value"),
-    Input("genre-dropdown", "value"),
-    Input("topic-dropdown", "value"),
-)
+# Build the book count by printer chart
 def update_book_count_by_printer(
     selected_year_range,
     selected_printer,
@@ -1023,8 +881,8 @@ def update_book_count_by_printer(
     selected_genre,
     selected_topic,
 ):
-    filtered_df = filter_table(
-        df,
+    selection = filter_table(
+        index,
         selected_year_range,
         selected_printer,
         selected_dynasty,
@@ -1034,15 +892,11 @@ def update_book_count_by_printer(
         selected_topic,
     )
 
-    printer_counts = filtered_df.groupby("Printer")["id"].nunique().reset_index()
+    printer_counts = query.distinct_counts(selection, "Printer")
     printer_counts.columns = ["Printer", "count"]
 
     printer_counts = printer_counts.sort_values(by="count", ascending=False)
 
-    printer_counts = printer_counts[
-        printer_counts["Printer"].isin(filtered_df["Printer"].unique())
-    ]
-
     fig = go.Figure(layout=dict(template="plotly"))
     fig = px.bar(
         printer_counts,
@@ -1065,17 +919,7 @@ def update_book_count_by_printer(
     return fig
 
 
-# Define callback to update book count by language chart
-@callback(
-    Output("book-count-by-language", "figure"),
-    Input("year-range-slider", "value"),
-    Input("printer-dropdown", "value"),
-    Input("dynasty-dropdown", "value"),
-    Input("author-dropdown", "value"),
-    Input("language-dropdown", "value"),
-    Input("genre-dropdown", "value"),
-    Input("topic-dropdown", "value"),
-)
+# Build the book count by language chart
 def update_book_count_by_language(
     selected_year_range,
     selected_printer,
@@ -1085,8 +929,8 @@ def update_book_count_by_language(
     selected_genre,
     selected_topic,
 ):
-    filtered_df = filter_table(
-        df,
+    selection = filter_table(
+        index,
         selected_year_range,
         selected_printer,
         selected_dynasty,
@@ -1096,15 +940,11 @@ def update_book_count_by_language(
         selected_topic,
     )
 
-    language_counts = filtered_df.groupby("language_cs")["id"].nunique().reset_index()
+    language_counts = query.distinct_counts(selection, "language_cs")
     language_counts.columns = ["language_cs", "count"]
 
     language_counts = language_counts.sort_values(by="count", ascending=False)
 
-    language_counts = language_counts[
-        language_counts["language_cs"].isin(filtered_df["language_cs"].unique())
-    ]
-
     fig = go.Figure(layout=dict(template="plotly"))
     fig = px.bar(
         language_counts,
@@ -1125,17 +965,7 @@ def update_book_count_by_language(
     return fig
 
 
-# Define callback to update book count by genre chart
-@callback(
-    Output("book-count-by-genre", "figure"),
-    Input("year-range-slider", "value"),
-    Input("printer-dropdown", "value"),
-    Input("dynasty-dropdown", "value"),
-    Input("author-dropdown", "value"),
-    Input("language-dropdown", "value"),
-    Input("genre-dropdown", "value"),
-    Input("topic-dropdown", "value"),
-)
+# Build the book count by genre chart
 def update_book_count_by_genre(
     selected_year_range,
     selected_printer,
@@ -1145,8 +975,8 @@ def update_book_count_by_genre(
     selected_genre,
     selected_topic,
 ):
-    filtered_df = filter_table(
-        df,
+    selection = filter_table(
+        index,
         selected_year_range,
         selected_printer,
         selected_dynasty,
@@ -1156,17 +986,13 @@ def update_book_count_by_genre(
         selected_topic,
     )
 
-    genre_counts = filtered_df.groupby("genre")["id"].nunique().reset_index()
+    genre_counts = query.distinct_counts(selection, "genre")
     genre_counts.columns = ["genre", "count"]
 
     genre_counts = genre_counts.sort_values(by="count", ascending=False)
 
     genre_counts = genre_counts.dropna(subset=["genre"])
 
-    genre_counts = genre_counts[
-        genre_counts["genre"].isin(filtered_df["genre"].unique())
-    ]
-
     fig = go.Figure(layout=dict(template="plotly"))
     fig = px.bar(
         genre_counts,
@@ -1187,17 +1013,7 @@ def update_book_count_by_genre(
     return fig
 
 
-# Define callback to update book count by topic chart
-@callback(
-    Output("book-count-by-topic", "figure"),
-    Input("year-range-slider", "value"),
-    Input("printer-dropdown", "value"),
-    Input("dynasty-dropdown", "value"),
-    Input("author-dropdown", "value"),
-    Input("language-dropdown", "value"),
-    Input("genre-dropdown", "value"),
-    Input("topic-dropdown", "value"),
-)
+# Build the book count by topic chart
 def update_book_count_by_topic(
     selected_year_range,
     selected_printer,
@@ -1207,8 +1023,8 @@ def update_book_count_by_topic(
     selected_genre,
     selected_topic,
 ):
-    filtered_df = filter_table(
-        df,
+    selection = filter_table(
+        index,
         selected_year_range,
         selected_printer,
         selected_dynasty,
@@ -1218,17 +1034,13 @@ def update_book_count_by_topic(
         selected_topic,
     )
 
-    topic_counts = filtered_df.groupby("topic")["id"].nunique().reset_index()
+    topic_counts = query.distinct_counts(selection, "topic")
     topic_counts.columns = ["topic", "count"]
 
     topic_counts = topic_counts.sort_values(by="count", ascending=False)
 
     topic_counts = topic_counts.dropna(subset=["topic"])
 
-    topic_counts = topic_counts[
-        topic_counts["topic"].isin(filtered_df["topic"].unique())
-    ]
-
     fig = go.Figure(layout=dict(template="plotly"))
     fig = px.bar(
         topic_counts,
@@ -1249,17 +1061,7 @@ def update_book_count_by_topic(
     return fig
 
 
-# Define callback to update correspondence analysis chart for genres
-@callback(
-    Output("correspondence-analysis-genre", "figure"),
-    Input("year-range-slider", "value"),
-    Input("printer-dropdown", "value"),
-    Input("dynasty-dropdown", "value"),
-    Input("author-dropdown", "value"),
-    Input("language-dropdown", "value"),
-    Input("genre-dropdown", "value"),
-    Input("topic-dropdown", "value"),
-)
+# Build the correspondence analysis chart for genres
 def update_correspondence_analysis_genre(
     selected_year_range,
     selected_printer,
@@ -1269,8 +1071,8 @@ def update_correspondence_analysis_genre(
     selected_genre,
     selected_topic,
 ):
-    filtered_df = filter_table(
-        df,
+    selection = filter_table(
+        index,
         selected_year_range,
         selected_printer,
         selected_dynasty,
@@ -1280,7 +1082,7 @@ def update_correspondence_analysis_genre(
         selected_topic,
     )
 
-    contingency_table = pd.crosstab(filtered_df["genre"], filtered_df["language_cs"])
+    contingency_table = query.contingency(selection, "genre", "language_cs")
 
     if contingency_table.shape[0] < 3 or contingency_table.shape[1] < 3:
         fig_ca = go.Figure()
@@ -1299,11 +1101,7 @@ def update_correspondence_analysis_genre(
         )
         return fig_ca
 
-    ca = prince.CA(n_components=2)
-    ca = ca.fit(contingency_table)
-
-    row_coords = ca.row_coordinates(contingency_table)
-    col_coords = ca.column_coordinates(contingency_table)
+    row_coords, col_coords = correspondence.coordinates(contingency_table)
 
     df_ca_plot = pd.concat(
         [row_coords, col_coords], keys=["Žánry", "Jazyky"]
@@ -1338,17 +1136,7 @@ def update_correspondence_analysis_genre(
     return fig_ca
 
 
-# Define callback to update correspondence analysis chart for topics
-@callback(
-    Output("correspondence-analysis-topic", "figure"),
-    Input("year-range-slider", "value"),
-    Input("printer-dropdown", "value"),
-    Input("dynasty-dropdown", "value"),
-    Input("author-dropdown", "value"),
-    Input("language-dropdown", "value"),
-    Input("genre-dropdown", "value"),
-    Input("topic-dropdown", "value"),
-)
+# Build the correspondence analysis chart for topics
 def update_correspondence_analysis_topic(
     selected_year_range,
     selected_printer,
@@ -1358,8 +1146,8 @@ def update_correspondence_analysis_topic(
     selected_genre,
     selected_topic,
 ):
-    filtered_df = filter_table(
-        df,
+    selection = filter_table(
+        index,
         selected_year_range,
         selected_printer,
         selected_dynasty,
@@ -1369,7 +1157,7 @@ def update_correspondence_analysis_topic(
         selected_topic,
     )
 
-    contingency_table = pd.crosstab(filtered_df["topic"], filtered_df["language_cs"])
+    contingency_table = query.contingency(selection, "topic", "language_cs")
 
     if contingency_table.shape[0] < 3 or contingency_table.shape[1] < 3:
         fig_ca = go.Figure()
@@ -1388,11 +1176,7 @@ def update_correspondence_analysis_topic(
         )
         return fig_ca
 
-    ca = prince.CA(n_components=2)
-    ca = ca.fit(contingency_table)
-
-    row_coords = ca.row_coordinates(contingency_table)
-    col_coords = ca.column_coordinates(contingency_table)
+    row_coords, col_coords = correspondence.coordinates(contingency_table)
 
     df_ca_plot = pd.concat(
         [row_coords, col_coords], keys=["Témata", "Jazyky"]
@@ -1425,3 +1209,119 @@ def update_correspondence_analysis_topic(
     )
 
     return fig_ca
+
+
+# Figures of the years, sent per year and binned by the selected interval in the
+# browser (assets/2-grafy.js), with the facet coloring their bars.
+YEAR_FIGURES = [
+    ("book-count-by-year", update_book_count_by_year, None),
+    ("book-count-by-year-language", update_book_count_by_year_language, "language_cs"),
+    ("book-count-by-year-genre", update_book_count_by_year_genre, "genre"),
+    ("book-count-by-year-topic", update_book_count_by_year_topic, "topic"),
+]
+
+FIGURE_UPDATES = [
+    ("book-count-by-year-line", update_book_count_by_year_line),
+    ("book-count-by-dynasty", update_book_count_by_dynasty),
+    ("book-count-by-dynasty-language", update_book_count_by_dynasty_language),
+    ("book-count-by-dynasty-genre", update_book_count_by_dynasty_genre),
+    ("book-count-by-dynasty-topic", update_book_count_by_dynasty_topic),
+    ("book-count-by-printer", update_book_count_by_printer),
+    ("book-count-by-language", update_book_count_by_language),
+    ("book-count-by-genre", update_book_count_by_genre),
+    ("book-count-by-topic", update_book_count_by_topic),
+    ("correspondence-analysis-genre", update_correspondence_analysis_genre),
+    ("correspondence-analysis-topic", update_correspondence_analysis_topic),
+]
+
+
+def _plain(values) -> list:
+    # Plotly stores numeric arrays as base64 typed-array specs.
+    if isinstance(values, dict) and "bdata" in values:
+        values = np.frombuffer(base64.b64decode(values["bdata"]), values["dtype"])
+    return np.asarray(values).tolist()
+
+
+def year_series(*filters):
+    """Per-year figures of YEAR_FIGURES, with plain lists the browser can rebin.
+
+    ``ranks`` holds the category code of every trace; plotly express orders
+    the traces by the first bar and then by category, so the browser needs
+    them to order the traces of the binned figures the same way.
+    """
+    figures, ranks = [], []
+    for _, update, facet in YEAR_FIGURES:
+        figure = update(*filters).to_plotly_json()
+        for trace in figure["data"]:
+            for name in ["x", "y", "text"]:
+                if name in trace:
+                    trace[name] = _plain(trace[name])
+        figures.append(figure)
+        if facet is None:
+            ranks.append([0] * len(figure["data"]))
+        else:
+            categories = index.model.bridges[facet][facet].cat.categories
+            ranks.append(
+                [int(categories.get_loc(trace["name"])) for trace in figure["data"]]
+            )
+    return {"figures": figures, "ranks": ranks}
+
+
+# Define one callback rendering all figures from a single filtered selection
+@callback(
+    [Output(figure_id, "figure") for figure_id, _ in FIGURE_UPDATES]
+    + [Output("year-series", "data")],
+    Input("year-range-slider", "value"),
+    Input("printer-dropdown", "value"),
+    Input("dynasty-dropdown", "value"),
+    Input("author-dropdown", "value"),
+    Input("language-dropdown", "value"),
+    Input("genre-dropdown", "value"),
+    Input("topic-dropdown", "value"),
+    State("session-id", "data"),
+)
+def update_figures(
+    selected_year_range,
+    selected_printer,
+    selected_dynasty,
+    selected_author,
+    selected_language,
+    selected_genre,
+    selected_topic,
+    session_id,
+):
+    filters = (
+        selected_year_range,
+        selected_printer,
+        selected_dynasty,
+        selected_author,
+        selected_language,
+        selected_genre,
+        selected_topic,
+    )
+
+    key = list(query.filter_key(*filters))
+
+    def build(update, *arguments):
+        # Filter within the session first, refining its previous result; the
+        # builder then finds the selection in the cache.
+        filter_table(index, *filters, session=session_id)
+        return update(*arguments)
+
+    figures = [
+        resultcache.memoize(f"grafy/{figure_id}", key, lambda: build(update, *filters))
+        for figure_id, update in FIGURE_UPDATES
+    ]
+    series = resultcache.memoize(
+        "grafy/year-series", key, lambda: build(year_series, *filters)
+    )
+    return figures + [series]
+
+
+# Switching the interval only rebins the year series already in the browser.
+clientside_callback(
+    ClientsideFunction(namespace="grafy", function_name="rebin_years"),
+    [Output(figure_id, "figure") for figure_id, _, _ in YEAR_FIGURES],
+    Input("year-series", "data"),
+    Input("year-interval-checklist", "value"),
+)
@@ -1,56 +1,29 @@
-import pandas as pd
 import plotly.graph_objects as go
 import networkx as nx
-import locale
 
 from dash import dcc, html, callback
 import dash
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 
-dash.register_page(__name__)
+from knihtisk import codes, facets, query, resultcache, search, store
+from knihtisk.collation import sort_czech
 
-df = pd.read_csv("data/Data_knihtisk.csv", sep=";")
-dynasties = pd.read_csv("data/dynastie_přehled.csv", sep=";")
+dash.register_page(__name__)
 
-df["publishDate"] = df["publishDate"].astype(int)
-df["Printer"] = df["Printer"].astype(str)
-df["genre"] = df["genre"].astype(str)
-df["topic"] = df["topic"].astype(str)
-df["author"] = df["author"].astype(str)
-df["id"] = df["id"].astype(str)
-df["language_cs"] = df["language_cs"].astype(str)
-df["author"] = df["author"].astype(str)
+index = store.facet_index()
+df = index.model.editions
+dynasties = store.dynasties()
 
 MIN_YEAR = df["publishDate"].min()
 MAX_YEAR = df["publishDate"].max()
 
-df = df.merge(dynasties, on="Printer", how="left")
-
-language_options = [
-    {"label": lang, "value": lang}
-    for lang in df["language_cs"].unique()
-    if pd.notna(lang)
-]
-genre_options = [
-    {"label": lang, "value": lang} for lang in df["genre"].unique() if pd.notna(lang)
-]
-topic_options = [
-    {"label": lang, "value": lang} for lang in df["topic"].unique() if pd.notna(lang)
-]
-author_options = [
-    {"label": lang, "value": lang} for lang in df["author"].unique() if pd.notna(lang)
-]
-
-def sort_czech(items, key=lambda x:x):
-    return sorted(items, key=lambda x:locale.strxfrm(key(x)))
-
 layout = html.Div(
     [
         html.Div(
             [
                 html.Label("Rok vydání:"),
                 dcc.RangeSlider(
-                    id="year-range-slider",
+                    id="network-year-range-slider",
                     min=df["publishDate"].min(),
                     max=df["publishDate"].max(),
                     step=1,
@@ -64,11 +37,8 @@ layout = html.Div(
             [
                 html.Label("Výběr tiskaře:"),
                 dcc.Dropdown(
-                    id="printer-dropdown",
-                    options=[
-                        {"label": printer, "value": printer}
-                        for printer in sort_czech(df["Printer"].unique())
-                    ],
+                    id="network-printer-dropdown",
+                    options=[],
                     value=None,
                     multi=True,
                 ),
@@ -79,7 +49,7 @@ layout = html.Div(
             [
                 html.Label("Výběr tiskařské rodiny/dynastie:"),
                 dcc.Dropdown(
-                    id="dynasty-dropdown",
+                    id="network-dynasty-dropdown",
                     options=[
                         {"label": dynasty, "value": dynasty}
                         for dynasty in sort_czech(dynasties["Dynastie"].dropna().unique())
@@ -94,70 +64,92 @@ layout = html.Div(
     ]
 )
 
+# Printers are searched on the server, which sends the most productive first;
+# both dropdowns offer only the values with editions under the other selections.
+@callback(
+    Output("network-printer-dropdown", "options"),
+    Input("network-printer-dropdown", "search_value"),
+    Input("network-printer-dropdown", "value"),
+    Input("network-year-range-slider", "value"),
+    Input("network-dynasty-dropdown", "value"),
+)
+def search_printers(
+    search_value, selected_printer, selected_year_range, selected_dynasty
+):
+    key = query.filter_key(selected_year_range, selected_printer, selected_dynasty)
+    counts = facets.facet_counts(index, key, ["Printer"])["Printer"]
+    return search.options(
+        store.search_index("Printer"), search_value, selected_printer, counts
+    )
+
+
+@callback(
+    Output("network-dynasty-dropdown", "options"),
+    Input("network-year-range-slider", "value"),
+    Input("network-printer-dropdown", "value"),
+    Input("network-dynasty-dropdown", "value"),
+)
+def update_dynasty_options(selected_year_range, selected_printer, selected_dynasty):
+    key = query.filter_key(selected_year_range, selected_printer, selected_dynasty)
+    counts = facets.facet_counts(index, key, ["Dynastie"])["Dynastie"]
+    return facets.options(index, "Dynastie", counts, selected_dynasty)
+
+
 def filter_table(
-    df,
+    index,
     selected_year_range,
     selected_printer,
     selected_dynasty,
+    session=None,
 ):
-    filtered_df = df[
-        (df["publishDate"] >= selected_year_range[0])
-        & (df["publishDate"] <= selected_year_range[1])
-    ]
-
-    if selected_printer:
-        filtered_df = filtered_df[filtered_df["Printer"].isin(selected_printer)]
-
-    if selected_dynasty:
-        dynasties_printers = df[df["Dynastie"].isin(selected_dynasty)][
-            "Printer"
-        ].unique()
-        filtered_df = filtered_df[filtered_df["Printer"].isin(dynasties_printers)]
-
-    filtered_df = filtered_df.drop_duplicates(
-        subset=["id", "Printer", "author", "language_cs", "genre", "topic", "Dynastie"]
+    return query.select(
+        index,
+        selected_year_range,
+        printers=selected_printer,
+        dynasties=selected_dynasty,
+        session=session,
     )
 
-    return filtered_df
-
 
-@callback(
-    Output("social-network-analysis", "figure"),
-    Input("year-range-slider", "value"),
-    Input("printer-dropdown", "value"),
-    Input("dynasty-dropdown", "value"),
-)
-def update_social_network_analysis(
+# Build the social network chart
+def build_social_network_analysis(
     selected_year_range,
     selected_printer,
     selected_dynasty,
+    session_id,
 ):
-    filtered_df = filter_table(
-        df,
+    selection = filter_table(
+        index,
         selected_year_range,
         selected_printer,
         selected_dynasty,
+        session=session_id,
     )
 
-    unique_author_books = filtered_df.drop_duplicates(subset=["id", "author"])
+    author_books = query.pairs(selection, "author")
+    unique_author_books = author_books.drop_duplicates(subset=["id", "author"])
 
     if selected_printer is None:
         selected_printer = []
 
     if selected_dynasty:
         selected_printer.extend(
-            df[df["Dynastie"].isin(selected_dynasty)]["Printer"].unique()
+            df[codes.isin(df["Dynastie"], selected_dynasty)]["Printer"].unique()
         )
 
     B = nx.Graph()
 
-    printers = filtered_df["Printer"].unique()
-    authors = filtered_df["author"].unique()
+    printers = selection.editions["Printer"].unique()
+    authors = author_books["author"].unique()
 
     B.add_nodes_from(printers, bipartite=0)
     B.add_nodes_from(authors, bipartite=1)
 
-    edges = list(filtered_df[["Printer", "author"]].itertuples(index=False, name=None))
+    edges = list(
+        author_books[["Printer", "author"]]
+        .drop_duplicates()
+        .itertuples(index=False, name=None)
+    )
     B.add_edges_from(edges)
 
     valid_selected_printers = [
@@ -171,7 +163,9 @@ def update_social_network_analysis(
     subgraph_nodes = set(valid_selected_printers).union(neighbors)
     subgraph = B.subgraph(subgraph_nodes)
 
-    author_counts = unique_author_books.groupby("author")["id"].nunique().to_dict()
+    author_counts = (
+        unique_author_books.groupby("author", observed=True)["id"].nunique().to_dict()
+    )
     printer_total_counts = {
         printer: unique_author_books[unique_author_books["Printer"] == printer][
             "id"
@@ -252,3 +246,26 @@ def update_social_network_analysis(
     )
 
     return fig
+
+
+@callback(
+    Output("social-network-analysis", "figure"),
+    Input("network-year-range-slider", "value"),
+    Input("network-printer-dropdown", "value"),
+    Input("network-dynasty-dropdown", "value"),
+    State("session-id", "data"),
+)
+def update_social_network_analysis(
+    selected_year_range,
+    selected_printer,
+    selected_dynasty,
+    session_id,
+):
+    key = query.filter_key(selected_year_range, selected_printer, selected_dynasty)
+    return resultcache.memoize(
+        "network",
+        list(key),
+        lambda: build_social_network_analysis(
+            selected_year_range, selected_printer, selected_dynasty, session_id
+        ),
+    )